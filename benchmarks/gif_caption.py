@@ -0,0 +1,97 @@
+"""
+Captions a synthetic animated GIF and reports frames/sec and peak memory, first with Pillow's ``save_all``,
+which holds every captioned frame before writing any, then streamed a frame at a time by
+:func:`utils.gif_caption.caption_animation`. Each mode runs in its own process so peak RSS is measured separately.
+
+Run from the repository root:
+
+    python -m benchmarks.gif_caption --frames 120 --size 480
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+from PIL import Image, ImageDraw, ImageSequence
+
+from utils.gif_caption import FrameBudget, caption_animation, caption_boxes, render_overlay
+from utils.meme_templates import IMPACT_FONT_PATH
+
+TEXTS = ["top text", "bottom text"]
+
+
+def make_animation(frames: int, size: int) -> bytes:
+    images = []
+    for i in range(frames):
+        image = Image.new("RGB", (size, size), (i * 7 % 256, i * 13 % 256, i * 29 % 256))
+        offset = i % size
+        ImageDraw.Draw(image).ellipse((offset, offset, offset + size // 4, offset + size // 4), fill=(255, 255, 255))
+        images.append(image)
+
+    buff = io.BytesIO()
+    images[0].save(buff, format="gif", save_all=True, append_images=images[1:], duration=40, loop=0)
+    return buff.getvalue()
+
+
+def save_all(data: bytes) -> int:
+    with Image.open(io.BytesIO(data)) as animation:
+        overlay = render_overlay(animation.size, caption_boxes(animation.size), TEXTS, IMPACT_FONT_PATH)
+        frames = []
+        for frame in ImageSequence.Iterator(animation):
+            composed = frame.convert("RGBA")
+            composed.alpha_composite(overlay)
+            frames.append(composed.convert("RGB"))
+
+    frames[0].save(io.BytesIO(), format="gif", save_all=True, append_images=frames[1:], duration=40, loop=0)
+    return len(frames)
+
+
+def streamed(data: bytes) -> int:
+    budget = FrameBudget(max_frames=sys.maxsize, max_pixels=sys.maxsize, max_output_bytes=sys.maxsize)
+    return caption_animation(io.BytesIO(data), TEXTS, IMPACT_FONT_PATH, io.BytesIO(), budget=budget)
+
+
+def run(mode: str, path: str) -> Tuple[int, float, int]:
+    with open(path, "rb") as file:
+        data = file.read()
+
+    start = time.perf_counter()
+    frames = (save_all if mode == "save_all" else streamed)(data)
+    elapsed = time.perf_counter() - start
+    # Kilobytes on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return frames, elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--size", type=int, default=480)
+    options = parser.parse_args()
+
+    # Everything, even making the input, happens in a fresh process, since a child starts out with its parent's peak RSS.
+    context = multiprocessing.get_context("spawn")
+    with tempfile.NamedTemporaryFile(suffix=".gif") as file:
+        with context.Pool(1) as pool:
+            data = pool.apply(make_animation, (options.frames, options.size))
+        file.write(data)
+        file.flush()
+        print(f"{options.frames} frames of {options.size}x{options.size}, {len(data):,} bytes")
+        del data
+
+        for mode in ("save_all", "streamed"):
+            with context.Pool(1) as pool:
+                frames, elapsed, peak = pool.apply(run, (mode, file.name))
+            print(f"{mode:<10}{frames / elapsed:>12.1f} frames/s{peak / 1024:>12.1f} MiB peak RSS")
+
+
+if __name__ == "__main__":
+    main()
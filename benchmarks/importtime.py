@@ -0,0 +1,103 @@
+"""
+Measures what importing the bot and every extension costs at startup, the way ``python -X importtime`` does,
+and fails when it's over the budget in ``[tool.millenia.importtime]`` of ``pyproject.toml``:
+
+    [tool.millenia.importtime]
+    budget_ms = 1500
+    lazy = ["PIL.Image", "replicate", "aiofiles"]
+
+``budget_ms`` caps the total, and the modules in ``lazy`` must not be imported at all until they're used.
+The imports run in a fresh interpreter, so nothing this process has imported already is left out.
+
+Run from the repository root:
+
+    python -m benchmarks.importtime --top 15
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tomllib
+from typing import Dict, List, NamedTuple
+
+PYPROJECT = "pyproject.toml"
+
+IMPORT_STARTUP = """
+import importlib
+import millenia
+from utils.startup import discover_extensions
+
+importlib.import_module("jishaku")
+for spec in discover_extensions():
+    importlib.import_module(spec.name)
+"""
+
+
+class ImportCost(NamedTuple):
+    name: str
+    # Microseconds spent in the module itself, and including everything it imported.
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure() -> List[ImportCost]:
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_STARTUP], capture_output=True, text=True, check=True
+    )
+
+    costs = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        stripped = name.lstrip()
+        # Nested imports are indented by two spaces per level under the one that imported them.
+        depth = (len(name) - len(stripped) - 1) // 2
+        costs.append(ImportCost(stripped, int(self_us), int(cumulative_us), depth))
+    return costs
+
+
+def load_config() -> Dict[str, object]:
+    with open(PYPROJECT, "rb") as file:
+        return tomllib.load(file).get("tool", {}).get("millenia", {}).get("importtime", {})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="How many of the most expensive modules to list")
+    options = parser.parse_args()
+
+    config = load_config()
+    costs = measure()
+    total_ms = sum(cost.cumulative_us for cost in costs if cost.depth == 0) / 1000
+
+    print(f"{'Module':<48}{'Self':>10}{'Cumulative':>14}")
+    for cost in sorted(costs, key=lambda cost: cost.self_us, reverse=True)[: options.top]:
+        print(f"{cost.name:<48}{cost.self_us / 1000:>8.1f}ms{cost.cumulative_us / 1000:>12.1f}ms")
+
+    print(f"\n{'Top level':<48}{'':>10}{'Cumulative':>14}")
+    for cost in sorted((cost for cost in costs if cost.depth == 0), key=lambda cost: cost.cumulative_us, reverse=True)[
+        : options.top
+    ]:
+        print(f"{cost.name:<48}{'':>10}{cost.cumulative_us / 1000:>12.1f}ms")
+
+    failures = []
+    budget_ms = config.get("budget_ms")
+    print(f"\nTotal {total_ms:.1f}ms" + (f" of a {budget_ms}ms budget" if budget_ms is not None else ""))
+    if budget_ms is not None and total_ms > float(budget_ms):  # type: ignore
+        failures.append(f"imports took {total_ms:.1f}ms, over the {budget_ms}ms budget")
+
+    imported = {cost.name for cost in costs}
+    for name in config.get("lazy", []):  # type: ignore
+        if name in imported:
+            failures.append(f"{name} is imported at startup but should be lazy")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
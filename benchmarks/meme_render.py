@@ -0,0 +1,75 @@
+"""
+Renders a burst of memes and reports renders/sec along with how far the event loop fell behind,
+first rendering inline on the loop the way the command used to, then through :class:`utils.meme_renderer.RenderPool`.
+
+Run from the repository root:
+
+    python -m benchmarks.meme_render --renders 64 --workers 2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+
+from utils.image_encoding import EncodedImage
+from utils.meme_renderer import RenderPool, render_meme
+
+TICK = 0.01
+TEMPLATE = "spongebob-scream"
+
+
+async def measure_lag(samples: List[float], stop: asyncio.Event) -> None:
+    """Records how late each ``TICK`` second sleep wakes up, in milliseconds."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        samples.append(max(loop.time() - expected, 0) * 1000)
+
+
+async def burst(label: str, renders: int, render: Callable[[int], Awaitable[object]]) -> None:
+    samples: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(measure_lag(samples, stop))
+    await asyncio.sleep(TICK * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(render(i) for i in range(renders)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await sampler
+
+    samples.sort()
+    p99 = samples[min(int(len(samples) * 0.99), len(samples) - 1)] if samples else 0.0
+    worst = samples[-1] if samples else 0.0
+    print(f"{label:<10}{renders / elapsed:>12.1f} renders/s{p99:>12.1f}ms p99 lag{worst:>12.1f}ms max lag")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    options = parser.parse_args()
+
+    async def inline(i: int) -> EncodedImage:
+        await asyncio.sleep(0)
+        return render_meme(TEMPLATE, [f"top text {i}", f"bottom text {i}"])
+
+    await burst("inline", options.renders, inline)
+
+    pool = RenderPool(max_workers=options.workers, max_queued=options.renders)
+    # Start the workers so process start up isn't counted against the burst.
+    await asyncio.gather(*(pool.render(render_meme, TEMPLATE, ["warm", "up"]) for _ in range(options.workers)))
+
+    async def pooled(i: int) -> EncodedImage:
+        return await pool.render(render_meme, TEMPLATE, [f"top text {i}", f"bottom text {i}"])
+
+    await burst("pool", options.renders, pooled)
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+Upscales synthetic images of several sizes with :class:`utils.tiled_upscale.LocalBackend` and reports seconds,
+output megapixels/sec and peak RSS, next to resizing and sharpening each image whole in one process.
+Each run happens in its own process so peak RSS is measured separately.
+
+Run from the repository root:
+
+    python -m benchmarks.tiled_upscale --sizes 256 512 1024 2048 --workers 2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
+from PIL import Image, ImageFilter
+
+from utils.tiled_upscale import LocalBackend
+
+
+def make_image(size: int) -> Image.Image:
+    return Image.effect_mandelbrot((size, size), (-2.0, -1.25, 0.5, 1.25), 100).convert("RGB")
+
+
+def peak_rss() -> float:
+    # Kilobytes on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def whole(size: int, scale: int) -> Tuple[float, int, float]:
+    img = make_image(size)
+    start = time.perf_counter()
+    output = img.resize((size * scale, size * scale), Image.Resampling.LANCZOS)
+    output = output.filter(ImageFilter.UnsharpMask(radius=2, percent=80, threshold=2))
+    return time.perf_counter() - start, output.width * output.height, peak_rss()
+
+
+def tiled(size: int, scale: int, tile_size: int, workers: int) -> Tuple[float, int, float]:
+    backend = LocalBackend(scale=scale, max_output_pixels=(size * scale) ** 2, tile_size=tile_size, max_workers=workers)
+    img = make_image(size)
+    # Start the workers so process start up isn't counted.
+    backend.upscale_image(make_image(16))
+
+    start = time.perf_counter()
+    output = backend.upscale_image(img)
+    elapsed = time.perf_counter() - start
+
+    asyncio.run(backend.close())
+    return elapsed, output.width * output.height, peak_rss()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024, 2048])
+    parser.add_argument("--scale", type=int, default=4)
+    parser.add_argument("--tile-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=2)
+    options = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for size in options.sizes:
+        for label, func, args in (
+            ("whole", whole, (size, options.scale)),
+            ("tiled", tiled, (size, options.scale, options.tile_size, options.workers)),
+        ):
+            # The tiled run's own workers aren't counted, its peak RSS is the coordinating process only.
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, pixels, peak = executor.submit(func, *args).result()
+            print(
+                f"{size:>5}px {label:<6}{elapsed:>10.2f}s{pixels / elapsed / 1e6:>10.1f} MP/s{peak:>10.1f} MiB peak RSS"
+            )
+
+
+if __name__ == "__main__":
+    main()
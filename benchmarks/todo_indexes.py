@@ -0,0 +1,90 @@
+"""
+Compares the `todo list` and `ticket check` queries against a full table scan and against the indexes added by
+the migrations in ``migrations/``.
+
+Run from the repository root:
+
+    python -m benchmarks.todo_indexes --rows 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from os import path
+from typing import Callable, Tuple
+
+from utils.migrations import load_migrations
+
+TODO_QUERY = "SELECT * FROM todos WHERE owner_id = ? AND guild_id = ?"
+TICKET_QUERY = "SELECT * FROM tickets WHERE owner_id = ?"
+
+
+def populate(conn: sqlite3.Connection, rows: int, owners: int, guilds: int) -> None:
+    rng = random.Random(0)
+    added_at = "2024-01-01T00:00:00+00:00"
+    for table in ("todos", "tickets"):
+        conn.executemany(
+            f"INSERT INTO {table}(owner_id, guild_id, channel_id, message_id, content, added_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (rng.randrange(owners), rng.randrange(guilds), 1, i, "some todo item content", added_at)
+                for i in range(rows)
+            ),
+        )
+    conn.commit()
+
+
+def time_query(conn: sqlite3.Connection, query: str, args: Callable[[], Tuple[int, ...]], repeat: int) -> float:
+    """Returns the mean time in milliseconds for one execution of ``query``."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(query, args()).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--owners", type=int, default=5_000)
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    options = parser.parse_args()
+
+    initial, *index_migrations = load_migrations()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(path.join(directory, "bench.sqlite"))
+        conn.executescript(initial.sql)
+
+        print(f"Inserting {options.rows:,} rows into todos and tickets...")
+        populate(conn, options.rows, options.owners, options.guilds)
+
+        todo_args = lambda: (rng.randrange(options.owners), rng.randrange(options.guilds))
+        ticket_args = lambda: (rng.randrange(options.owners),)
+
+        scan_todo = time_query(conn, TODO_QUERY, todo_args, options.repeat)
+        scan_ticket = time_query(conn, TICKET_QUERY, ticket_args, options.repeat)
+
+        for migration in index_migrations:
+            conn.executescript(migration.sql)
+        conn.execute("ANALYZE")
+
+        index_todo = time_query(conn, TODO_QUERY, todo_args, options.repeat)
+        index_ticket = time_query(conn, TICKET_QUERY, ticket_args, options.repeat)
+
+        for query, args in ((TODO_QUERY, todo_args()), (TICKET_QUERY, ticket_args())):
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", args).fetchall()
+            print(f"{query}\n    -> {'; '.join(row[-1] for row in plan)}")
+
+        conn.close()
+
+    print(f"\n{'query':<14}{'scan (ms)':>12}{'index (ms)':>12}{'speedup':>10}")
+    for label, scan, index in (("todo list", scan_todo, index_todo), ("ticket check", scan_ticket, index_ticket)):
+        print(f"{label:<14}{scan:>12.3f}{index:>12.3f}{scan / index:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares todo insert throughput when every insert commits on its own, the way `todo add` used to work,
+against the group commits done by :class:`utils.writebehind.InsertBatcher`.
+
+Run from the repository root:
+
+    python -m benchmarks.write_behind --inserts 5000 --concurrency 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from os import path
+
+import asqlite
+
+from utils.migrations import apply_migrations
+from utils.writebehind import InsertBatcher
+
+ROW = dict(owner_id=1, guild_id=1, channel_id=1, message_id=1, content="some todo item content", added_at="2024-01-01")
+
+
+async def insert_one_by_one(pool: asqlite.Pool) -> None:
+    async with pool.acquire() as conn:
+        await conn.fetchone(
+            "INSERT INTO todos(owner_id, guild_id, channel_id, message_id, content, added_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) RETURNING id",
+            *ROW.values(),
+        )
+        await conn.commit()
+
+
+async def run(label: str, inserts: int, concurrency: int, make_insert) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded() -> None:
+        async with semaphore:
+            await make_insert()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded() for _ in range(inserts)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22}{inserts / elapsed:>12,.0f} inserts/s  ({elapsed:.2f}s)")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inserts", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--max-batch", type=int, default=128)
+    parser.add_argument("--max-delay", type=float, default=0.005)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with asqlite.create_pool(path.join(directory, "bench.sqlite")) as pool:
+            await apply_migrations(pool)
+
+            await run("commit per insert", options.inserts, options.concurrency, lambda: insert_one_by_one(pool))
+
+            writer = InsertBatcher(pool, max_delay=options.max_delay, max_batch=options.max_batch)
+            writer.start()
+            await run("group commit", options.inserts, options.concurrency, lambda: writer.insert("todos", **ROW))
+            await writer.close()
+
+            async with pool.acquire() as conn:
+                row = await conn.fetchone("SELECT COUNT(*) AS total, COUNT(DISTINCT id) AS ids FROM todos")
+            print(f"\n{row['total']:,} rows written, {row['ids']:,} distinct ids")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import datetime
-import functools
+import io
 import logging
 import math
 import platform
 import sys
 import time
+from typing import Optional
 
 import discord
 from discord.ext import commands
@@ -15,9 +16,12 @@ from discord.utils import format_dt
 
 from millenia import Millenia
 from utils.context import Context
+from utils.lazy import lazy_import
+from utils.resource_sampler import ResourceSample
+from utils.stats_charts import render_trends
 
 try:
-    import psutil
+    psutil = lazy_import("psutil")
 except ImportError:
     psutil = None
 
@@ -34,7 +38,7 @@ class ApplicationInformation(commands.Cog):
     def __init__(self, bot: Millenia) -> None:
         self.bot = bot
 
-    def _generate_embed(self, app_info: discord.AppInfo, /) -> discord.Embed:
+    def _generate_embed(self, app_info: discord.AppInfo, sample: ResourceSample, /) -> discord.Embed:
         embed = discord.Embed(title="Application Info", color=discord.Color.blue())
         embed.add_field(name="Application ID", value=app_info.id, inline=False)
         embed.add_field(name="Application Name", value=app_info.name, inline=False)
@@ -72,8 +76,8 @@ class ApplicationInformation(commands.Cog):
         )
         embed.add_field(name="Tags", value=", ".join(app_info.tags) if app_info.tags else "Doesn't have any.", inline=False)
         embed.add_field(name="Description", value=app_info.description or "Doesn't have one.", inline=False)
-        embed.add_field(name="Servers", value=f"{len(self.bot.guilds):,}")
-        embed.add_field(name="Users", value=f"{len(self.bot.users):,}")
+        embed.add_field(name="Servers", value=f"{sample.guilds:,}")
+        embed.add_field(name="Members", value=f"{sample.members:,}")
 
         if hasattr(self.bot, "STARTED_AT"):
             embed.add_field(
@@ -87,12 +91,10 @@ class ApplicationInformation(commands.Cog):
         )
         embed.add_field(name="Python Version", value=f"{platform.python_implementation()} {platform.python_version()}")
         embed.add_field(name="discord.py Version", value=discord.__version__)
-        embed.add_field(name="WS Latency", value=f"{self.bot.latency*1000:.3f}ms")
+        embed.add_field(name="WS Latency", value=f"{sample.ws_latency*1000:.3f}ms")
 
-        if psutil is not None:
-            proc = psutil.Process()
-            mem = proc.memory_full_info()
-            l_1, l_5, l_15 = psutil.getloadavg()
+        if psutil is not None and sample.load_average is not None:
+            l_1, l_5, l_15 = sample.load_average
 
             if sys.platform == "darwin":
                 pass
@@ -111,19 +113,13 @@ class ApplicationInformation(commands.Cog):
             embed.add_field(name="CPU Count", value=f"{psutil.cpu_count()} ({platform.processor()})")
             embed.add_field(
                 name="Bot Using Memory",
-                value=f"Physical: {natural_size(mem.rss)} || Virtual: {natural_size(mem.vms)}",
+                value=f"Physical: {natural_size(sample.rss)} || Virtual: {natural_size(sample.vms)}",  # type: ignore
                 inline=False,
             )
-
-            v_mem = psutil.virtual_memory()
-
-            embed.add_field(
-                name="Memory Info",
-                value=f"Available: {natural_size(v_mem.available)} | Total: {natural_size(v_mem.total)}",
-                inline=False,
-            )
-            embed.add_field(name="Memory % Used", value=f"{v_mem.percent}%")
-            embed.add_field(name="Thread Count", value=f"{proc.num_threads()}")
+            available, total = natural_size(sample.memory_available), natural_size(sample.memory_total)  # type: ignore
+            embed.add_field(name="Memory Info", value=f"Available: {available} | Total: {total}", inline=False)
+            embed.add_field(name="Memory % Used", value=f"{sample.memory_percent}%")
+            embed.add_field(name="Thread Count", value=f"{sample.threads}")
             embed.add_field(name="Load Averages", value=f"1m: {l_1:.3f}% 5m: {l_5:.3f}% 15m: {l_15:.3f}%", inline=False)
 
         return embed
@@ -131,22 +127,48 @@ class ApplicationInformation(commands.Cog):
     @commands.command(aliases=("info",))
     async def appinfo(self, ctx: Context) -> None:
         """Sends application info."""
-        start = time.perf_counter()
-        app_info = await self.bot.application_info()
+        sampler = self.bot.sampler
+        app_info = await sampler.application_info()
 
         if app_info is None:
             await ctx.send("Something went wrong...")
             return
 
-        to_run = functools.partial(self._generate_embed, app_info)
-        embed = await asyncio.to_thread(to_run)
+        # Usage comes from the background sampler, only take a sample here if it hasn't taken one yet.
+        sample = sampler.latest or await sampler.sample()
+        embed = self._generate_embed(app_info, sample)
 
-        end = time.perf_counter()
-        embed.set_footer(text=f"Command took {end-start:.2f}s")
-        embed.timestamp = discord.utils.utcnow()
+        embed.set_footer(text="Usage sampled")
+        embed.timestamp = datetime.datetime.fromtimestamp(sample.at, datetime.timezone.utc)
 
         await ctx.send(embed=embed)
 
+    @commands.command()
+    @commands.cooldown(1, 10, commands.BucketType.channel)
+    async def stats(self, ctx: Context, hours: Optional[float] = None) -> None:
+        """Charts the bot's resource usage.
+
+        Parameters
+        ----------
+        hours : Optional[float]
+            How many of the most recent hours to chart, by default everything that's been sampled.
+        """
+        samples = list(self.bot.sampler.samples)
+        if hours is not None:
+            since = time.time() - hours * 60 * 60
+            samples = [sample for sample in samples if sample.at >= since]
+
+        if not samples:
+            await ctx.send("There aren't any samples to chart yet.")
+            return
+
+        # Drawing and encoding would stall the event loop.
+        chart = await asyncio.to_thread(render_trends, samples)
+        await ctx.send(
+            f"{len(samples):,} samples, one every {self.bot.sampler.interval:g}s",
+            file=discord.File(io.BytesIO(chart), "stats.png"),
+        )
+
 
 async def setup(bot: Millenia):
     _logger.info("Loading cog ApplicationInformation")
@@ -24,8 +24,9 @@ class Cleanup(commands.Cog):
             the amount of message you want to delete, by default 25
         """
 
+        prefix = self.bot.prefixes.get(ctx.guild.id).rstrip()
         deleted = await ctx.channel.purge(
-            check=lambda m: m.author == self.bot.user or m.content.startswith("aml"), limit=limit
+            check=lambda m: m.author == self.bot.user or m.content.startswith(prefix), limit=limit
         )
 
         messages_deleted_embed = create_embed_success(message=f"Deleted {len(deleted)} messages")
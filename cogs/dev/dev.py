@@ -1,21 +1,30 @@
 from __future__ import annotations
 
+import asyncio
 import copy
+import io
 import logging
 from typing import Literal, Optional, Union
 
 import discord
 from discord.ext import commands
+from discord.utils import format_dt
 
 from millenia import Millenia
 from utils.context import Context, GuildContext
+from utils.profiling import allocation_diff, sample_stacks
 
 _logger = logging.getLogger(__name__)
 
+# The wastebasket reaction below, payload.member comes with it so no member cache is needed.
+INTENTS = ("guild_reactions",)
+
 
 class Developer(commands.Cog):
     def __init__(self, bot: Millenia):
         self.bot = bot
+        # One profile at a time, two would skew each other and double the overhead.
+        self._profiling = asyncio.Lock()
 
     # Umbra's sync command, you probably know it.
     @commands.command()
@@ -130,6 +139,160 @@ class Developer(commands.Cog):
         new_ctx = await self.bot.get_context(msg, cls=type(ctx))
         await new_ctx.reinvoke()
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def startup(self, ctx: Context):
+        """Shows how long each phase of startup, and each extension, took to load."""
+        timings = self.bot.startup
+
+        lines = [f"{'Phase':<24}{'Start':>10}{'Took':>10}"]
+        for name, (start, duration) in timings.phases.items():
+            lines.append(f"{name:<24}{start:>9.2f}s{duration:>9.2f}s")
+
+        lines.append("")
+        lines.append(f"{'Extension':<34}{'Took':>10}")
+        for name, duration in sorted(timings.extensions.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"{name:<34}{duration:>9.2f}s")
+
+        ready = f"{timings.ready_after:.2f}s" if timings.ready_after is not None else "not yet"
+        lines.append("")
+        lines.append(f"Ready after {ready}")
+
+        # Extensions load concurrently, so their times overlap and don't add up to the extensions phase.
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def metrics(self, ctx: Context):
+        """Shows each command's latency percentiles, runs, errors and how many are running, busiest first."""
+        tracked = sorted(self.bot.metrics.commands.items(), key=lambda item: item[1].latency.count, reverse=True)
+        if not tracked:
+            await ctx.send("No commands have run yet.")
+            return
+
+        lines = [f"{'Command':<28}{'Runs':>7}{'Errors':>7}{'Now':>5}{'p50':>9}{'p95':>9}{'p99':>9}"]
+        # Keeps the table inside a message.
+        for (kind, name), stats in tracked[:20]:
+            label = f"/{name}" if kind == "app" else name
+            p50, p95, p99 = (stats.latency.quantile(q) * 1000 for q in (0.5, 0.95, 0.99))
+            lines.append(
+                f"{label[:27]:<28}{stats.latency.count:>7,}{stats.errors:>7,}{stats.in_flight:>5}"
+                f"{p50:>7.0f}ms{p95:>7.0f}ms{p99:>7.0f}ms"
+            )
+
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @commands.group(hidden=True, invoke_without_command=True)
+    @commands.is_owner()
+    async def queries(self, ctx: Context):
+        """Shows pool wait and commit times, and the statements that took the most time altogether."""
+        stats = self.bot.pool.stats
+        lines = [
+            f"{name} p50 {histogram.quantile(0.5) * 1000:.2f}ms, p95 {histogram.quantile(0.95) * 1000:.2f}ms "
+            f"over {histogram.count:,}"
+            for name, histogram in (("Acquire wait", stats.acquire_wait), ("Commit", stats.commits))
+        ]
+        lines += [
+            "",
+            f"{'Calls':>7}{'Total':>9}{'p50':>8}{'p95':>8}{'Rows':>8}{'Errors':>7}  Statement",
+        ]
+        busiest = sorted(stats.statements.items(), key=lambda item: item[1].latency.sum, reverse=True)
+        for sql, statement in busiest[:12]:
+            latency = statement.latency
+            lines.append(
+                f"{latency.count:>7,}{latency.sum * 1000:>7.0f}ms{latency.quantile(0.5) * 1000:>6.2f}ms"
+                f"{latency.quantile(0.95) * 1000:>6.2f}ms{statement.rows:>8,}{statement.errors:>7,}  {sql[:60]}"
+            )
+
+        await ctx.send("```\n" + "\n".join(lines)[:1900] + "\n```")
+
+    @queries.command(name="slow", hidden=True)
+    @commands.is_owner()
+    async def slow_queries(self, ctx: Context):
+        """Shows the most recent slow queries, with each statement's query plan the first time it was slow."""
+        slow = list(reversed(self.bot.pool.stats.slow))
+        if not slow:
+            await ctx.send(f"No queries have taken over {self.bot.pool.stats.slow_threshold * 1000:.0f}ms.")
+            return
+
+        lines = []
+        explained = set()
+        for query in slow[:10]:
+            lines.append(f"{format_dt(query.at, 'R')} {query.duration * 1000:,.0f}ms `{query.sql[:150]}`")
+            if query.plan and query.sql not in explained:
+                explained.add(query.sql)
+                lines.append(f"```\n{query.plan[:300]}\n```")
+
+        await ctx.send("\n".join(lines)[:2000])
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def blocking(self, ctx: Context, event: Optional[int] = None):
+        """Shows the times the event loop was blocked, most recent first. Pass an event's number to see its stack."""
+        monitor = self.bot.loop_monitor
+        events = list(reversed(monitor.events))
+
+        if event is not None:
+            if not 1 <= event <= len(events):
+                await ctx.send(f"There's no event {event}, there are {len(events)}.")
+                return
+
+            slow = events[event - 1]
+            # Innermost frames last, keep those if the whole stack doesn't fit.
+            stack = "".join(slow.stack)[-1800:] or "The loop got going again before its stack was caught."
+            await ctx.send(f"Blocked for {slow.duration * 1000:,.0f}ms in task {slow.task}\n```py\n{stack}\n```")
+            return
+
+        lines = [f"Loop lag is {monitor.lag * 1000:,.1f}ms, stalls over {monitor.threshold * 1000:,.0f}ms are kept."]
+        for i, slow in enumerate(events[:15], start=1):
+            where = slow.culprit or slow.coroutine or "uncaught"
+            lines.append(f"`{i:>2}` {format_dt(slow.at, 'R')} {slow.duration * 1000:,.0f}ms in `{where}`")
+
+        await ctx.send("\n".join(lines))
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def profile(self, ctx: Context, seconds: commands.Range[float, 1, 60] = 10.0):
+        """Samples what every thread is doing 100 times a second and uploads the collapsed stacks for a flame graph."""
+        if self._profiling.locked():
+            await ctx.send("A profile is already running.")
+            return
+
+        async with self._profiling:
+            await ctx.send(f"Profiling for {seconds:g}s...")
+            profile = await asyncio.to_thread(sample_stacks, seconds)
+
+        lines = [f"{profile.samples:,} samples over {profile.duration:.1f}s, most often running:"]
+        for frame, share in profile.hottest(10):
+            lines.append(f"`{share:>6.1%}` {frame}")
+
+        collapsed = discord.File(io.BytesIO(profile.collapsed().encode()), "profile.collapsed.txt")
+        await ctx.send("\n".join(lines)[:2000], file=collapsed)
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def allocations(self, ctx: Context, seconds: commands.Range[float, 1, 120] = 30.0):
+        """Traces memory allocations for a while and shows the lines whose allocations grew or shrank the most."""
+        if self._profiling.locked():
+            await ctx.send("A profile is already running.")
+            return
+
+        async with self._profiling:
+            await ctx.send(f"Tracing allocations for {seconds:g}s...")
+            sites = await asyncio.to_thread(allocation_diff, seconds)
+
+        if not sites:
+            await ctx.send("Nothing was allocated.")
+            return
+
+        lines = [f"{'Size':>11}{'Blocks':>9}  Where"]
+        for site in sites:
+            lines.append(f"{site.size_diff:>+11,}{site.count_diff:>+9,}  {site.location}")
+            if site.line:
+                lines.append(f"{'':>22}{site.line[:80]}")
+
+        await ctx.send("```\n" + "\n".join(lines)[:1900] + "\n```")
+
     @commands.command(hidden=True)
     @commands.is_owner()
     async def toggle(self, ctx: Context, *, command):
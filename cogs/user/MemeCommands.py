@@ -1,42 +1,159 @@
+import hashlib
 import io
 import logging
+from typing import Any, Callable, List, Literal
 
 import discord
 from discord import app_commands
 from discord.ext import commands
-from PIL import Image, ImageDraw, ImageFont
+from PIL import UnidentifiedImageError
 
 from millenia import Millenia
 from utils.context import GuildContext
+from utils.embed import create_embed_failure
+from utils.gif_caption import FrameBudget, FrameBudgetExceeded
+from utils.image_encoding import EXTENSIONS, EncodedImage, EncodingOptions, guess_format
+from utils.meme_renderer import RenderPool, RenderQueueFull, caption_image, render_meme
+from utils.meme_templates import MemeTemplateRegistry
+from utils.render_cache import RenderCache, meme_cache_key, normalize_text, render_cache_key
 
 _logger = logging.getLogger(__name__)
 
+MAX_CAPTION_INPUT_BYTES = 8 * 1024 * 1024
+
 
 class MemeCommands(commands.Cog):
     def __init__(self, bot: Millenia):
         self.bot = bot
-
-    @app_commands.command(
-        name="spongebob-scream", description="Generates a spongebob screaming meme with top and bottom text"
-    )
-    @app_commands.describe(top_text="Set top text of the meme, up to 33 char")
-    @app_commands.describe(bottom_text="Set bottom text of the meme, up to 33 char")
-    async def generate_spongebob_meme(self, interaction: discord.Interaction, top_text: str, bottom_text: str):
-        img = Image.open("./assets/spgbob_screaming.jpg")
-        buff = io.BytesIO()
-
-        font = ImageFont.truetype(font="./assets/impact.ttf", size=80)
-        draw = ImageDraw.Draw(img)
-
-        top_text = top_text.upper()
-        bottom_text = bottom_text.upper()
-
-        draw.text(xy=(570, 60), anchor="mm", text=top_text, font=font, stroke_width=3, stroke_fill=(0, 0, 0))
-        draw.text(xy=(570, 1060), anchor="mm", text=bottom_text, font=font, stroke_width=3, stroke_fill=(0, 0, 0))
-
-        img.save(buff, format="jpeg")
-        buff.seek(0)
-        await interaction.response.send_message(file=discord.File(buff, "spg-screaming.jpeg"))
+        self.templates = MemeTemplateRegistry.load()
+        self.render_pool = RenderPool()
+        self.render_cache = RenderCache()
+        self.encoding = EncodingOptions()
+        self.frame_budget = FrameBudget()
+
+    async def cog_unload(self) -> None:
+        self.render_pool.shutdown()
+
+    async def _send_render(
+        self,
+        interaction: discord.Interaction,
+        cache_key: str,
+        name: str,
+        func: Callable[..., EncodedImage],
+        *args: Any,
+    ) -> None:
+        """Sends the cached output for ``cache_key``, or renders it with ``func(*args)`` in the pool and caches it.
+        The interaction may already be deferred, if getting ``args`` together took a while.
+        """
+        cached = await self.render_cache.get(cache_key)
+        if cached is not None:
+            filename = f"{name}.{EXTENSIONS[guess_format(cached)]}"
+            await self._respond(interaction, file=discord.File(io.BytesIO(cached), filename))
+            return
+
+        busy_embed = create_embed_failure(message="I'm making too many memes right now, try again in a bit.")
+        if self.render_pool.full:
+            await self._respond(interaction, embed=busy_embed, ephemeral=True)
+            return
+
+        # Rendering can outlast the 3 second window to respond in when the pool is busy.
+        if not interaction.response.is_done():
+            await interaction.response.defer(thinking=True)
+
+        try:
+            image = await self.render_pool.render(func, *args)
+        except RenderQueueFull:
+            await interaction.followup.send(embed=busy_embed)
+            return
+        except FrameBudgetExceeded as e:
+            await interaction.followup.send(embed=create_embed_failure(message=f"That's too big for me to caption. {e}."))
+            return
+        except UnidentifiedImageError:
+            await interaction.followup.send(embed=create_embed_failure(message="I can't read that image."))
+            return
+
+        await self.render_cache.put(cache_key, image.data)
+        await interaction.followup.send(file=discord.File(io.BytesIO(image.data), f"{name}.{image.extension}"))
+
+    @staticmethod
+    async def _respond(interaction: discord.Interaction, **kwargs: Any) -> None:
+        if interaction.response.is_done():
+            await interaction.followup.send(**kwargs)
+        else:
+            await interaction.response.send_message(**kwargs)
+
+    async def template_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=f"{template.display_name} ({len(template.boxes)} boxes)", value=template.name)
+            for template in self.templates.search(current)
+        ]
+
+    @app_commands.command(name="meme", description="Generates a meme from a template")
+    @app_commands.describe(template="The meme template to use")
+    @app_commands.describe(text="The text for each box of the template, separated by |, e.g. top text | bottom text")
+    @app_commands.describe(output_format="The image format to send, by default whichever is smallest")
+    @app_commands.autocomplete(template=template_autocomplete)
+    async def generate_meme(
+        self,
+        interaction: discord.Interaction,
+        template: str,
+        text: str,
+        output_format: Literal["auto", "webp", "jpeg", "png"] = "auto",
+    ):
+        meme_template = self.templates.get(template)
+        if meme_template is None:
+            no_template_embed = create_embed_failure(message=f"I don't have a meme template called `{template}`.")
+            await interaction.response.send_message(embed=no_template_embed, ephemeral=True)
+            return
+
+        texts = [part.strip() for part in text.split("|")]
+        if len(texts) > len(meme_template.boxes):
+            too_many_embed = create_embed_failure(
+                message=f"{meme_template.display_name} only has {len(meme_template.boxes)} text boxes."
+            )
+            await interaction.response.send_message(embed=too_many_embed, ephemeral=True)
+            return
+
+        if any(len(part) > meme_template.max_chars for part in texts):
+            too_long_embed = create_embed_failure(
+                message=f"Each box's text has to be {meme_template.max_chars} characters or less."
+            )
+            await interaction.response.send_message(embed=too_long_embed, ephemeral=True)
+            return
+
+        texts = [normalize_text(part, uppercase=box.uppercase) for part, box in zip(texts, meme_template.boxes)]
+        cache_key = meme_cache_key(meme_template.name, meme_template.version, texts, output_format)
+        encoding = self.encoding if output_format == "auto" else self.encoding._replace(formats=(output_format,))
+
+        await self._send_render(
+            interaction, cache_key, meme_template.name, render_meme, meme_template.name, texts, encoding, self.frame_budget
+        )
+
+    @app_commands.command(name="caption", description="Adds top and bottom text to an image or animated GIF")
+    @app_commands.describe(image="The image or GIF to caption")
+    @app_commands.describe(text="The top and bottom text, separated by |, e.g. top text | bottom text")
+    async def caption(self, interaction: discord.Interaction, image: discord.Attachment, text: str):
+        if not (image.content_type or "").startswith("image/"):
+            not_image_embed = create_embed_failure(message="That isn't an image.")
+            await interaction.response.send_message(embed=not_image_embed, ephemeral=True)
+            return
+
+        if image.size > MAX_CAPTION_INPUT_BYTES:
+            too_big_embed = create_embed_failure(
+                message=f"Images have to be {MAX_CAPTION_INPUT_BYTES // (1024 * 1024)} MiB or smaller."
+            )
+            await interaction.response.send_message(embed=too_big_embed, ephemeral=True)
+            return
+
+        texts = [normalize_text(part, uppercase=True) for part in text.split("|")][:2]
+        # Downloading the image can take longer than the 3 seconds there are to respond in.
+        await interaction.response.defer(thinking=True)
+        data = await self.bot.images.read_attachment(image, interaction.user.id)
+        cache_key = render_cache_key("caption", hashlib.sha256(data).hexdigest(), texts)
+
+        await self._send_render(
+            interaction, cache_key, "caption", caption_image, data, texts, self.encoding, self.frame_budget
+        )
 
     @commands.command(name="flmancode")
     @commands.guild_only()
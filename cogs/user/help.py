@@ -13,19 +13,24 @@ _logger = logging.getLogger(__name__)
 
 
 class MilleniaHelp(commands.MinimalHelpCommand):
+    def get_destination(self) -> discord.abc.Messageable:
+        # Through the context, so rerunning help by editing the message edits its reply.
+        return self.context
+
     async def send_bot_help(self, mapping: Mapping[Optional[Cog], List[Command[Any, ..., Any]]], /) -> None:
         destination = self.get_destination()
 
         help_embed = discord.Embed(
             title="Millenia Help Commands",
-            description="Use `aml help [command]` for more info on a command.\nYou can also use `aml help [category]` for more info on a category.",
+            description=f"Use `{self.context.clean_prefix}help [command]` for more info on a command.\n"
+            f"You can also use `{self.context.clean_prefix}help [category]` for more info on a category.",
             color=GREEN_EMBED_COLOR,
         )
         help_embed.set_footer(text=f"Listed are the commands you can run")
         field_description = StringIO()
 
         for command in await self.filter_commands(self.context.bot.walk_commands()):
-            field_description.write(f"\naml {command.qualified_name}")
+            field_description.write(f"\n{self.context.clean_prefix}{command.qualified_name}")
 
         help_embed.add_field(name="Commands", value=field_description.getvalue())
         await destination.send(embed=help_embed)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import logging
+
+from discord.ext import commands
+
+from millenia import Millenia
+from utils.context import GuildContext
+from utils.embed import create_embed_failure, create_embed_success
+from utils.prefixes import InvalidPrefix
+
+_logger = logging.getLogger(__name__)
+
+
+class PrefixCog(commands.Cog):
+    def __init__(self, bot: Millenia):
+        self.bot = bot
+
+    @commands.group(invoke_without_command=True)
+    @commands.guild_only()
+    async def prefix(self, ctx: GuildContext):
+        """Shows the prefix used in this server."""
+        await ctx.send(embed=create_embed_success(message=f"The prefix here is `{self.bot.prefixes.get(ctx.guild.id)}`"))
+
+    @prefix.command(name="set")
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def set_prefix(self, ctx: GuildContext, prefix: str):
+        """Changes the prefix used in this server.
+
+        Parameters
+        ----------
+        prefix : str
+            The new prefix. Put it in quotes to end it with a space, e.g. `aml prefix set "m! "`
+        """
+        try:
+            await self.bot.prefixes.set(ctx.guild.id, prefix)
+        except InvalidPrefix as e:
+            await ctx.send(embed=create_embed_failure(message=str(e)))
+            return
+
+        await ctx.send(embed=create_embed_success(message=f"The prefix here is now `{prefix}`"))
+
+    @prefix.command(name="reset")
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def reset_prefix(self, ctx: GuildContext):
+        """Goes back to the default prefix in this server."""
+        await self.bot.prefixes.set(ctx.guild.id, None)
+        await ctx.send(embed=create_embed_success(message=f"The prefix here is back to `{self.bot.prefixes.default}`"))
+
+
+async def setup(bot: Millenia):
+    _logger.info("Loading cog PrefixCog")
+    await bot.add_cog(PrefixCog(bot))
+
+
+async def teardown(_: Millenia):
+    _logger.info("Unloading cog PrefixCog")
@@ -1,5 +1,5 @@
 import logging
-from typing import Any, List
+from typing import Any, Dict, List, Optional
 
 import discord
 from discord.ext import commands
@@ -9,11 +9,25 @@ from utils.constants import GREEN_EMBED_COLOR
 from utils.context import Context, GuildContext
 from utils.dataclasses import TicketItem
 from utils.embed import create_embed_failure, create_embed_success
-from utils.paginator import BaseButtonPaginator
+from utils.paginator import BaseKeysetPaginator, KeysetPageSource
 
 _logger = logging.getLogger(__name__)
 
 
+async def fetch_user(bot: Millenia, user_id: int, /) -> Optional[discord.User]:
+    """The user with ``user_id``, asking Discord for them when they aren't cached.
+    The bot doesn't cache members (see utils/intents.py), so most ticket owners won't be.
+    """
+    user = bot.get_user(user_id)
+    if user is not None:
+        return user
+
+    try:
+        return await bot.fetch_user(user_id)
+    except discord.HTTPException:
+        return None
+
+
 class TicketSystem(commands.Cog):
     def __init__(self, bot: Millenia):
         self.bot = bot
@@ -41,21 +55,18 @@ class TicketSystem(commands.Cog):
         message_id = ctx.message.id
         added_at = discord.utils.utcnow().isoformat()
 
-        async with self.bot.pool.acquire() as conn:
-            row = await conn.fetchone(
-                """
-            INSERT INTO tickets(owner_id, guild_id, channel_id, message_id, content, added_at) VALUES (?, ?, ?, ?, ?, ?) RETURNING id""",
-                owner_id,
-                guild_id,
-                channel_id,
-                message_id,
-                content,
-                added_at,
-            )
-            await conn.commit()
+        item_id = await self.bot.writer.insert(
+            "tickets",
+            owner_id=owner_id,
+            guild_id=guild_id,
+            channel_id=channel_id,
+            message_id=message_id,
+            content=content,
+            added_at=added_at,
+        )
 
         ticket_submitted_embed = create_embed_success(message=f"Your ticket has been submitted.\nThank you!")
-        ticket_submitted_embed.set_footer(text=f"Ticket ID: {row['id']}")
+        ticket_submitted_embed.set_footer(text=f"Ticket ID: {item_id}")
         await ctx.send(embed=ticket_submitted_embed)
 
     @ticket.command()
@@ -66,18 +77,20 @@ class TicketSystem(commands.Cog):
         ----------
         ctx : GuildContext
         """
-        async with self.bot.pool.acquire() as conn:
-            results = await conn.fetchall("""SELECT * FROM tickets WHERE owner_id = ?""", ctx.author.id)
+        source = KeysetPageSource(
+            self.bot.pool,
+            "tickets",
+            TicketItem.from_row,
+            where="owner_id = ?",
+            args=(ctx.author.id,),
+        )
+        view = await ThisPaginator.create(source, per_page=1, target=ctx)
 
-        if not results:
+        if not view.total_entries:
             no_todos_embed = create_embed_failure(message="You don't have any ticket submissions.")
             await ctx.send(embed=no_todos_embed)
             return
 
-        entries = [TicketItem.from_row(row) for row in results]
-
-        view = ThisPaginator(entries=entries, per_page=1, target=ctx)
-
         user_tickets = await view.embed()
 
         await ctx.send(embed=user_tickets, view=view)
@@ -87,18 +100,14 @@ class TicketSystem(commands.Cog):
     async def all(self, ctx: Context):
         """Check all the tickets submissions made by users accross all servers that the bot is in"""
 
-        async with self.bot.pool.acquire() as conn:
-            results = await conn.fetchall("""SELECT * FROM tickets""")
+        source = KeysetPageSource(self.bot.pool, "tickets", TicketItem.from_row)
+        view = await BotOwnerPaginator.create(source, per_page=1, target=ctx)
 
-        if not results:
+        if not view.total_entries:
             no_tickets_embed = create_embed_failure(message="There are no tickets to see right now.")
             await ctx.send(embed=no_tickets_embed)
             return
 
-        entries = [TicketItem.from_row(row) for row in results]
-
-        view = BotOwnerPaginator(entries=entries, per_page=1, target=ctx)
-
         handle_tickets_embed = await view.embed()
 
         await ctx.send(embed=handle_tickets_embed, view=view)
@@ -126,7 +135,7 @@ class TicketSystem(commands.Cog):
             await conn.commit()
 
             if row:
-                ticket_owner_id = self.bot.get_user(row["owner_id"])
+                ticket_owner_id = await fetch_user(self.bot, row["owner_id"])
 
                 remove_embed = discord.Embed(
                     title="You have marked this ticket submission as resolved",
@@ -161,7 +170,7 @@ class TicketSystem(commands.Cog):
             await ctx.send(embed=unable_to_resolve_emebed)
 
 
-class ThisPaginator(BaseButtonPaginator[TicketItem, Millenia]):
+class ThisPaginator(BaseKeysetPaginator[TicketItem, Millenia]):
     async def format_page(self, entries: List[TicketItem], /) -> discord.Embed:
         """Formats the however you want the page of your embed to look
 
@@ -188,7 +197,20 @@ class ThisPaginator(BaseButtonPaginator[TicketItem, Millenia]):
         return embed
 
 
-class BotOwnerPaginator(BaseButtonPaginator[TicketItem, Millenia]):
+class BotOwnerPaginator(BaseKeysetPaginator[TicketItem, Millenia]):
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # Ticket owners already looked up, so flipping back and forth doesn't ask Discord again.
+        self._owners: Dict[int, Optional[discord.User]] = {}
+
+    async def _owner(self, user_id: int, /) -> Optional[discord.User]:
+        # Only missing before the paginator is sent anywhere.
+        if self.bot is None:
+            return None
+        if user_id not in self._owners:
+            self._owners[user_id] = await fetch_user(self.bot, user_id)
+        return self._owners[user_id]
+
     async def format_page(self, entries: List[TicketItem], /) -> discord.Embed:
         """Formats the however you want the page of your embed to look
 
@@ -210,7 +232,8 @@ class BotOwnerPaginator(BaseButtonPaginator[TicketItem, Millenia]):
         embed.add_field(name="Ticket Content", value=f"{entry.content}")
         embed.add_field(name="Ticket ID", value=f"{entry.id}", inline=False)
         embed.add_field(name="From Server", value=f"{self.bot.get_guild(entry.guild_id).name}")  # type: ignore
-        embed.add_field(name="User who submitted ticket", value=f"{self.bot.get_user(entry.owner_id).name}#{self.bot.get_user(entry.owner_id).discriminator}")  # type: ignore
+        owner = await self._owner(entry.owner_id)
+        embed.add_field(name="User who submitted ticket", value=str(owner) if owner else f"<@{entry.owner_id}>")
         embed.add_field(name="Server ID", value=entry.guild_id, inline=False)
         embed.add_field(name="User ID", value=entry.owner_id, inline=True)
 
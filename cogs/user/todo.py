@@ -1,24 +1,68 @@
 from __future__ import annotations
 
 import logging
-from typing import List
+import sys
+from dataclasses import astuple
+from typing import List, Optional, Tuple
 
 import discord
 from discord.ext import commands
 
 from millenia import Millenia
+from utils.cache import SizedTTLCache
 from utils.constants import GREEN_EMBED_COLOR
-from utils.context import GuildContext
+from utils.context import Context, GuildContext
 from utils.dataclasses import TodoItem
 from utils.embed import create_embed_failure, create_embed_success
-from utils.paginator import BaseButtonPaginator
+from utils.paginator import BaseButtonPaginator, BaseKeysetPaginator, KeysetPageSource
 
 _logger = logging.getLogger(__name__)
 
+TODO_CACHE_MAX_BYTES = 4 * 1024 * 1024
+TODO_CACHE_TTL = 10 * 60
+# Lists longer than this aren't cached, they're paged from the database instead.
+TODO_CACHE_MAX_ITEMS = 250
+
+
+def todo_list_size(items: List[TodoItem], /) -> int:
+    """Estimates the memory used by a list of todo items in bytes."""
+    return sys.getsizeof(items) + sum(
+        sys.getsizeof(item) + sum(sys.getsizeof(value) for value in astuple(item)) for item in items
+    )
+
 
 class ToDoCog(commands.Cog):
     def __init__(self, bot: Millenia):
         self.bot = bot
+        self.todo_cache: SizedTTLCache[Tuple[int, int], List[TodoItem]] = SizedTTLCache(
+            max_bytes=TODO_CACHE_MAX_BYTES, ttl=TODO_CACHE_TTL, sizeof=todo_list_size
+        )
+        # Bumped before and after every write, so a list read that overlapped a write in any way isn't cached.
+        self._todo_writes = 0
+
+    async def _fetch_todo_list(self, owner_id: int, guild_id: int) -> Optional[List[TodoItem]]:
+        """Reads a user's todo list through the cache. Returns ``None`` if the list is too long to cache."""
+        key = (owner_id, guild_id)
+        entries = self.todo_cache.get(key)
+        if entries is not None:
+            return entries
+
+        writes = self._todo_writes
+        async with self.bot.pool.acquire() as conn:
+            rows = await conn.fetchall(
+                """SELECT * FROM todos WHERE owner_id = ? AND guild_id = ? ORDER BY id LIMIT ?""",
+                owner_id,
+                guild_id,
+                TODO_CACHE_MAX_ITEMS + 1,
+            )
+
+        if len(rows) > TODO_CACHE_MAX_ITEMS:
+            return None
+
+        entries = [TodoItem.from_row(row) for row in rows]
+        if writes == self._todo_writes:
+            self.todo_cache.set(key, entries)
+        return entries
 
     @commands.group()
     async def todo(self, ctx: GuildContext) -> None:
@@ -43,41 +87,57 @@ class ToDoCog(commands.Cog):
         message_id = ctx.message.id
         added_at = discord.utils.utcnow().isoformat()
 
-        async with self.bot.pool.acquire() as conn:
-            row = await conn.fetchone(
-                """
-            INSERT INTO todos(owner_id, guild_id, channel_id, message_id, content, added_at) VALUES (?, ?, ?, ?, ?, ?) RETURNING id""",
-                owner_id,
-                guild_id,
-                channel_id,
-                message_id,
-                content,
-                added_at,
-            )
-            await conn.commit()
+        self._todo_writes += 1
+        item_id = await self.bot.writer.insert(
+            "todos",
+            owner_id=owner_id,
+            guild_id=guild_id,
+            channel_id=channel_id,
+            message_id=message_id,
+            content=content,
+            added_at=added_at,
+        )
+        # The insert may have waited for its batch to commit, a read in the meantime can't have seen it.
+        self._todo_writes += 1
+
+        item = TodoItem(item_id, owner_id, guild_id, channel_id, message_id, content, added_at)
+        key = (owner_id, guild_id)
+        # Keep a cached list in step with the table, unless it's grown too long to cache.
+        cached = self.todo_cache.peek(key)
+        if cached is not None and len(cached) < TODO_CACHE_MAX_ITEMS:
+            self.todo_cache.set(key, [*cached, item])
+        else:
+            self.todo_cache.invalidate(key)
 
         added_to_list_embed = create_embed_success(message=f"Added that to your list.")
-        added_to_list_embed.set_footer(text=f"ID: {row['id']}")
+        added_to_list_embed.set_footer(text=f"ID: {item_id}")
         await ctx.send(embed=added_to_list_embed)
 
     @todo.command(name="list")
     async def list_all_todo_items(self, ctx: GuildContext):
         """List all your todo items"""
 
-        async with self.bot.pool.acquire() as conn:
-            results = await conn.fetchall(
-                """SELECT * FROM todos WHERE owner_id = ? AND guild_id = ?""", ctx.author.id, ctx.guild.id
+        entries = await self._fetch_todo_list(ctx.author.id, ctx.guild.id)
+
+        if entries is not None:
+            view = ThisPaginator(entries=entries, per_page=1, target=ctx)
+            total_entries = len(entries)
+        else:
+            source = KeysetPageSource(
+                self.bot.pool,
+                "todos",
+                TodoItem.from_row,
+                where="owner_id = ? AND guild_id = ?",
+                args=(ctx.author.id, ctx.guild.id),
             )
+            view = await ThisKeysetPaginator.create(source, per_page=1, target=ctx)
+            total_entries = view.total_entries
 
-        if not results:
+        if not total_entries:
             no_todos_embed = create_embed_failure(message="You don't seem to have any todos.")
             await ctx.send(embed=no_todos_embed)
             return
 
-        entries = [TodoItem.from_row(row) for row in results]
-
-        view = ThisPaginator(entries=entries, per_page=1, target=ctx)
-
         todo_embed = await view.embed()
 
         await ctx.send(embed=todo_embed, view=view)
@@ -91,6 +151,7 @@ class ToDoCog(commands.Cog):
         item_id : int
             The id of the to-do list item.
         """
+        self._todo_writes += 1
         async with self.bot.pool.acquire() as conn:
             row = await conn.fetchone(
                 """DELETE FROM todos WHERE owner_id = ? AND guild_id = ? AND id = ? RETURNING *""",
@@ -98,8 +159,14 @@ class ToDoCog(commands.Cog):
                 ctx.guild.id,
                 item_id,
             )
+            await conn.commit()
+            self._todo_writes += 1
 
             if row:
+                self.todo_cache.update(
+                    (ctx.author.id, ctx.guild.id), lambda items: [item for item in items if item.id != item_id]
+                )
+
                 remove_embed = create_embed_success(message=f"The item\n\n{row['content']}\n\nhas been removed.")
                 await ctx.send(embed=remove_embed)
                 return
@@ -107,6 +174,22 @@ class ToDoCog(commands.Cog):
             unable_to_remove_emebed = create_embed_failure(message=f"Unable to remove todo item with ID: {item_id}")
             await ctx.send(embed=unable_to_remove_emebed)
 
+    @todo.command(name="cache", hidden=True)
+    @commands.is_owner()
+    async def todo_cache_stats(self, ctx: Context):
+        """Shows how the todo list cache is doing."""
+        stats = self.todo_cache.stats
+
+        embed = discord.Embed(title="Todo list cache", color=GREEN_EMBED_COLOR)
+        embed.add_field(name="Hit Rate", value=f"{stats.hit_rate:.1%}")
+        embed.add_field(name="Hits", value=f"{stats.hits:,}")
+        embed.add_field(name="Misses", value=f"{stats.misses:,}")
+        embed.add_field(name="Evictions", value=f"{stats.evictions:,}")
+        embed.add_field(name="Expirations", value=f"{stats.expirations:,}")
+        embed.add_field(name="Cached Lists", value=f"{stats.entries:,}")
+        embed.add_field(name="Memory", value=f"{stats.size:,} / {stats.max_size:,} bytes", inline=False)
+        await ctx.send(embed=embed)
+
 
 class ThisPaginator(BaseButtonPaginator[TodoItem, Millenia]):
     # The subclassed format page function that implements the logic of creating our embed.
@@ -137,6 +220,11 @@ class ThisPaginator(BaseButtonPaginator[TodoItem, Millenia]):
         return embed
 
 
+class ThisKeysetPaginator(BaseKeysetPaginator[TodoItem, Millenia]):
+    # Used for lists too long to cache, pages are fetched as they're needed.
+    format_page = ThisPaginator.format_page
+
+
 async def setup(bot: Millenia):
     _logger.info("Loading cog ToDoCog")
     await bot.add_cog(ToDoCog(bot))
@@ -1,60 +1,164 @@
-import json
+import asyncio
+import io
 import logging
 import os
-from io import BytesIO
-from tempfile import TemporaryDirectory
+from typing import Optional
 
 import discord
-import replicate
 from discord.ext import commands
 
 from millenia import Millenia
+from utils.constants import GREEN_EMBED_COLOR
 from utils.context import Context
-from utils.DiscordImageSaver import DiscordImageSaver
 from utils.embed import create_embed_failure, create_embed_success
+from utils.tiled_upscale import LocalBackend
+from utils.upscale_cache import UpscaleCache
+from utils.upscale_input import InvalidUpscaleInput, prepare_input
+from utils.upscale_jobs import (
+    ReplicateBackend,
+    UpscaleBackend,
+    UpscaleJob,
+    UpscaleLimitReached,
+    UpscaleQueue,
+    UpscaleQueueFull,
+    UpscaleResult,
+    image_key,
+)
 
 _logger = logging.getLogger(__name__)
 
+# How often the queue position message is refreshed while a job waits.
+POSITION_UPDATE_INTERVAL = 5
+MAX_UPSCALE_INPUT_BYTES = 25 * 1024 * 1024
+# "replicate" for the hosted Real-ESRGAN model, or "local" to upscale on this machine's CPU.
+UPSCALE_BACKEND = os.getenv("UPSCALE_BACKEND", "replicate")
+
+
+def create_backend(name: str) -> UpscaleBackend:
+    if name == "local":
+        return LocalBackend()
+    if name == "replicate":
+        return ReplicateBackend()
+    raise ValueError(f"Unknown upscale backend {name!r}")
+
+
 class UpScalerCog(commands.Cog):
     def __init__(self, bot: Millenia):
         self.bot = bot
+        self.cache = UpscaleCache(bot.pool)
+        self.queue = UpscaleQueue(create_backend(UPSCALE_BACKEND), cache=self.cache)
 
-    
+    async def cog_load(self) -> None:
+        self.queue.start()
+
+    async def cog_unload(self) -> None:
+        await self.queue.close()
 
     @commands.command()
     async def upscale (self, ctx: Context, image: discord.Attachment):
         """Upscale and clean up an image.
         \n
-        This image must be downloaded to use in the api as a path, as the api cannot handle image url links, or buffers
-        \n
-        The downloaded image will be promptly deleted after being sent in `Context`
+        The image is queued and upscaled in the background, identical images being upscaled at the same time
+        only get upscaled once, and images that were upscaled before are sent straight from the cache.
 
         Parameters
         ----------
         ctx : `Context`
             The command's context
         """
-        
-        image_provided_embed = create_embed_success(message="Output image loading, this may take up to 20 seconds")
+        if not (image.content_type or "").startswith("image/"):
+            await ctx.send(embed=create_embed_failure(message="That isn't an image."))
+            return
+
+        if image.size > MAX_UPSCALE_INPUT_BYTES:
+            too_big_embed = create_embed_failure(
+                message=f"Images have to be {MAX_UPSCALE_INPUT_BYTES // (1024 * 1024)} MiB or smaller."
+            )
+            await ctx.send(embed=too_big_embed)
+            return
+
+        data = await self.bot.images.read_attachment(image, ctx.author.id)
+        # Keyed by the original bytes, so a cached upscale skips preparing the input too.
+        key = image_key(data)
+
+        result = await self.cache.get(key, self.queue.backend.version)
+        if result is None:
+            try:
+                prepared = await asyncio.to_thread(prepare_input, data, self.queue.backend.max_input_pixels)
+            except InvalidUpscaleInput as e:
+                await ctx.send(embed=create_embed_failure(message=f"{e}."))
+                return
+
+            if prepared.downscaled:
+                _logger.debug("Downscaled an upscale input from %s to %s", prepared.original_size, prepared.size)
+
+            result = await self._run_job(ctx, prepared.data, key)
+            if result is None:
+                return
+
+        if result.data is not None:
+            await ctx.send(file=discord.File(io.BytesIO(result.data), f"upscaled.{result.extension}"))
+        else:
+            await ctx.send(f"{result.url}")
+
+    async def _run_job(self, ctx: Context, data: bytes, key: str) -> Optional[UpscaleResult]:
+        """Queues an upscale, keeping the author up to date on where it's at. Returns ``None`` if it didn't work out."""
+        try:
+            job = self.queue.submit(ctx.author.id, data, key=key)
+        except UpscaleLimitReached:
+            limit_embed = create_embed_failure(
+                message=f"You can only have {self.queue.max_per_user} upscales going at once, wait for one to finish."
+            )
+            await ctx.send(embed=limit_embed)
+            return None
+        except UpscaleQueueFull:
+            await ctx.send(embed=create_embed_failure(message="Too many upscales are queued right now, try again later."))
+            return None
+
+        position = self.queue.position(job)
+        if position:
+            status = await ctx.send(embed=create_embed_success(message=f"Queued, you're #{position} in line"))
+            while not job.started.is_set():
+                try:
+                    await asyncio.wait_for(job.started.wait(), POSITION_UPDATE_INTERVAL)
+                except asyncio.TimeoutError:
+                    current = self.queue.position(job)
+                    if current and current != position:
+                        position = current
+                        await status.edit(embed=create_embed_success(message=f"Queued, you're #{position} in line"))
+
+            await status.edit(embed=create_embed_success(message="Output image loading, this may take up to 20 seconds"))
+        else:
+            await ctx.send(embed=create_embed_success(message="Output image loading, this may take up to 20 seconds"))
 
-        await ctx.send(embed=image_provided_embed)
+        try:
+            return await job.wait()
+        except Exception:
+            await ctx.send(embed=create_embed_failure(message="Something went wrong upscaling that image."))
+            return None
 
-        buffer = BytesIO(await image.read())
+    @commands.command(name="upscalecache", hidden=True)
+    @commands.is_owner()
+    async def upscale_cache_stats(self, ctx: Context):
+        """Shows how the upscale cache is doing."""
+        stats = await self.cache.stats()
 
-        output_image = replicate.run(
-            "nightmareai/real-esrgan:42fed1c4974146d4d2414e2be2c5277c7fcf05fcc3a73abf41610695738c1d7b", 
-            input={
-                "image": buffer
-            }
-        )
-        await ctx.send(f"{output_image}")
+        embed = discord.Embed(title="Upscale cache", color=GREEN_EMBED_COLOR)
+        embed.add_field(name="Hit Rate", value=f"{stats.hit_rate:.1%}")
+        embed.add_field(name="Hits", value=f"{stats.hits:,}")
+        embed.add_field(name="Misses", value=f"{stats.misses:,}")
+        embed.add_field(name="Evictions", value=f"{stats.evictions:,}")
+        embed.add_field(name="Expirations", value=f"{stats.expirations:,}")
+        embed.add_field(name="Cached Upscales", value=f"{stats.entries:,}")
+        embed.add_field(name="Storage", value=f"{stats.size:,} / {stats.max_size:,} bytes", inline=False)
+        embed.set_footer(text=f"Backend: {self.queue.backend.version}")
+        await ctx.send(embed=embed)
 
-        #os.remove(f"{path}")
 
 async def setup(bot: Millenia):
-    _logger.info("Loading cog ToDoCog")
+    _logger.info("Loading cog UpScalerCog")
     await bot.add_cog(UpScalerCog(bot))
 
 
 async def teardown(_: Millenia):
-    _logger.info("Unloading cog UpScalerCog")
\ No newline at end of file
+    _logger.info("Unloading cog UpScalerCog")
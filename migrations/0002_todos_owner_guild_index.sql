@@ -0,0 +1,2 @@
+-- `todo list` filters on (owner_id, guild_id) and walks ids in order.
+CREATE INDEX IF NOT EXISTS todos_owner_guild_id_idx ON todos(owner_id, guild_id, id);
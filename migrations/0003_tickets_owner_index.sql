@@ -0,0 +1,2 @@
+-- `ticket check` filters on owner_id and walks ids in order.
+CREATE INDEX IF NOT EXISTS tickets_owner_id_idx ON tickets(owner_id, id);
@@ -0,0 +1,17 @@
+-- Upscaled outputs, keyed by the SHA-256 of the input image and the version of the backend that made them.
+-- Remote backends only hand back a URL, local ones the encoded image.
+CREATE TABLE IF NOT EXISTS upscale_cache(
+    input_hash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    url TEXT,
+    data BLOB,
+    extension TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (input_hash, version)
+);
+CREATE INDEX IF NOT EXISTS upscale_cache_expires_at_idx ON upscale_cache(expires_at);
+CREATE INDEX IF NOT EXISTS upscale_cache_last_used_at_idx ON upscale_cache(last_used_at);
@@ -0,0 +1,24 @@
+-- Downloaded images, stored once per distinct content under the SHA-256 of their bytes.
+CREATE TABLE IF NOT EXISTS images(
+    hash TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_last_accessed_at_idx ON images(last_accessed_at);
+
+-- Everyone who saved an image, the same image can belong to several users.
+CREATE TABLE IF NOT EXISTS image_owners(
+    hash TEXT NOT NULL REFERENCES images(hash) ON DELETE CASCADE,
+    owner_id INTEGER NOT NULL,
+    PRIMARY KEY (hash, owner_id)
+);
+CREATE INDEX IF NOT EXISTS image_owners_owner_id_idx ON image_owners(owner_id);
+
+-- Where images were downloaded from, so the same attachment isn't fetched twice.
+CREATE TABLE IF NOT EXISTS image_sources(
+    source TEXT PRIMARY KEY,
+    hash TEXT NOT NULL REFERENCES images(hash) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS image_sources_hash_idx ON image_sources(hash);
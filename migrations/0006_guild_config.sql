@@ -0,0 +1,5 @@
+-- Per-server settings, a server without a row uses the defaults.
+CREATE TABLE IF NOT EXISTS guild_config(
+    guild_id INTEGER PRIMARY KEY,
+    prefix TEXT
+);
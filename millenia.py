@@ -2,56 +2,181 @@ from __future__ import annotations
 
 import asyncio
 import datetime
+import logging
 import os
-import pathlib
 import sys
-from typing import Union
+import time
+from typing import Optional, Union
 
+import aiohttp
 import asqlite
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
-from utils.context import Context
+from utils.context import Context, response_cache
+from utils.image_store import ImageStore
+from utils.instrumented_pool import InstrumentedPool
+from utils.intents import GatewayProfile, lean_profile, log_profile, log_savings
+from utils.loop_monitor import LoopMonitor
+from utils.metrics import CommandMetrics, InstrumentedTree, MetricsServer, finish_app_command, invoked_name
+from utils.migrations import apply_migrations
+from utils.prefixes import PrefixCache
+from utils.resource_sampler import ResourceSampler
+from utils.startup import StartupTimings, discover_extensions, load_extensions
+from utils.writebehind import InsertBatcher
 
 load_dotenv()
 
+_logger = logging.getLogger(__name__)
+
 TESTING = sys.platform != "linux"
 
 DB_FILENAME = "millenia.sqlite" if not TESTING else "test-millenia.sqlite"
+# Servers can set their own, see utils/prefixes.py.
 COMMAND_PREFIX = "aml "
-INTENTS = discord.Intents.all()
+# What the bot itself needs to run prefix commands, extensions declare anything else they need (see utils/intents.py).
+INTENTS = ("guilds", "guild_messages", "dm_messages", "message_content")
+# Editing a message only reruns its command while the message is still cached.
+MAX_MESSAGES = 1000
+# Set LEAN_MODE=false to connect with every intent and discord.py's default caches.
+LEAN_MODE = os.getenv("LEAN_MODE", "true").lower() != "false"
 TOKEN = str(os.getenv("DISCORD_BOT_TOKEN")) if not TESTING else str(os.getenv("TEST_BOT_TOKEN"))
 
+# The shared HTTP session's connection pool, separate from discord.py's own.
+HTTP_CONNECTION_LIMIT = 64
+HTTP_CONNECTIONS_PER_HOST = 8
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=60, sock_connect=10)
+
+# How often in seconds `aml appinfo` and `aml stats` get a fresh resource sample.
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", 60))
+
+# Set METRICS_PORT to serve command metrics for Prometheus on localhost, see utils/metrics.py.
+METRICS_PORT = os.getenv("METRICS_PORT")
+
 
 class Millenia(commands.Bot):
     STARTED_AT: datetime.datetime
-
-    def __init__(self, command_prefix, pool: asqlite.Pool, **options) -> None:
-        super().__init__(command_prefix=command_prefix, **options)
-        self.pool = pool
+    session: aiohttp.ClientSession
+    images: ImageStore
+
+    def __init__(self, command_prefix, pool: asqlite.Pool, *, profile: Optional[GatewayProfile] = None, **options) -> None:
+        self.gateway_profile = profile or GatewayProfile.full()
+        super().__init__(
+            command_prefix=command_prefix, tree_cls=InstrumentedTree, **self.gateway_profile.options(), **options
+        )
+        # Records wait times, query latencies and slow queries, see `aml queries`.
+        self.pool = InstrumentedPool(pool)
+        self.writer = InsertBatcher(self.pool)
+        self.prefixes = PrefixCache(self.pool, command_prefix)
+        self.responses = response_cache()
+        self.metrics = CommandMetrics()
+        # Commands are timed from the events around them, see utils/metrics.py.
+        self.add_listener(self._command_started, "on_command")
+        self.add_listener(self._command_finished, "on_command_completion")
+        self.add_listener(self._command_finished, "on_command_error")
+        self.add_listener(self._app_command_finished, "on_app_command_completion")
+        self.loop_monitor = LoopMonitor()
+        self.sampler = ResourceSampler(self, interval=STATS_INTERVAL)
+        self.metrics_server = MetricsServer(self.metrics, port=int(METRICS_PORT)) if METRICS_PORT else None
         self.STARTED_AT = discord.utils.utcnow()
+        self.startup = StartupTimings()
+
+    async def login(self, token: str) -> None:
+        # Ends when setup_hook starts, login calls it once it's logged in.
+        self.startup.begin("login")
+        await super().login(token)
 
     async def setup_hook(self) -> None:
-        await self.load_extension("jishaku")
+        self.startup.end("login")
+        self.loop_monitor.start()
+        self.sampler.start()
+
+        # One keep-alive connection pool for every cog's HTTP requests, instead of a handshake per request.
+        connector = aiohttp.TCPConnector(limit=HTTP_CONNECTION_LIMIT, limit_per_host=HTTP_CONNECTIONS_PER_HOST)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=HTTP_TIMEOUT)
+
+        with self.startup.phase("jishaku"):
+            await self.load_extension("jishaku")
         os.environ["JISHAKU_NO_UNDERSCORE"] = "True"
         os.environ["JISHAKU_NO_DM_TRACEBACK"] = "True"
         os.environ["JISHAKU_HIDE"] = "True"
 
-        with open("schema.sql", "r") as file:
-            schema = file.read()
-
-        async with self.pool.acquire() as conn:
-            await conn.executescript(schema)
+        with self.startup.phase("schema"):
+            await apply_migrations(self.pool)
+        with self.startup.phase("prefixes"):
+            await self.prefixes.load()
+        self.writer.start()
+        self.images = ImageStore(self.pool, self.session)
+        self.images.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
 
         # Loads anything in the cogs folder that doesn't start with an _
-        for file in sorted(pathlib.Path("cogs").glob("**/[!_]*.py")):
-            ext = ".".join(file.parts).removesuffix(".py")
-            await self.load_extension(ext)
-
-    async def on_message_edit(self, _: discord.Message, after: discord.Message) -> None:
-        """Allow editing messages to rerun commands."""
-        await self.process_commands(after)
+        with self.startup.phase("extensions"):
+            await load_extensions(self, discover_extensions(), self.startup, loaded=self.extensions)
+
+        self.startup.begin("gateway")
+
+    async def close(self) -> None:
+        # Flush any queued inserts before the pool goes away.
+        await self.writer.close()
+        if hasattr(self, "images"):
+            await self.images.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        await self.sampler.close()
+        await self.loop_monitor.close()
+        if hasattr(self, "session"):
+            await self.session.close()
+        await super().close()
+
+    async def on_ready(self) -> None:
+        self.startup.end("gateway")
+        if self.startup.mark_ready():
+            _logger.info("Ready %.2fs after starting up", self.startup.ready_after)
+            log_savings(self.gateway_profile, self.guilds)
+
+    def could_be_command(self, message: discord.Message, /) -> bool:
+        """Whether ``message`` is worth parsing for a command, without building a context for it."""
+        if message.author.bot:
+            return False
+        return self.prefixes.could_be_command(message.guild.id if message.guild else None, message.content)
+
+    async def get_prefix(self, message: discord.Message, /) -> str:
+        # Runs for every message, so it only ever reads from memory.
+        return self.prefixes.get(message.guild.id if message.guild else None)
+
+    async def on_message(self, message: discord.Message, /) -> None:
+        if self.could_be_command(message):
+            await self.process_commands(message)
+
+    async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
+        """Allow editing messages to rerun commands, editing the replies from the last run instead of sending more."""
+        # Embeds unfurling edit the message too, without changing what it says.
+        if before.content == after.content or not self.could_be_command(after):
+            return
+
+        ctx = await self.get_context(after)
+        ctx.reusable_responses = list(self.responses.get(after.id) or ())
+        self.responses.invalidate(after.id)
+        await self.invoke(ctx)
+        await ctx.discard_unused_responses()
+
+    async def _command_started(self, ctx: Context, /) -> None:
+        ctx.tracked_command = invoked_name(ctx)
+        self.metrics.started("prefix", ctx.tracked_command)
+
+    async def _command_finished(self, ctx: Context, /, *_) -> None:
+        # A command that wasn't found never started.
+        if ctx.tracked_command is None:
+            return
+        duration = time.perf_counter() - ctx.started_at
+        self.metrics.finished("prefix", ctx.tracked_command, ctx.command.qualified_name, duration, failed=ctx.command_failed)
+        ctx.tracked_command = None
+
+    async def _app_command_finished(self, interaction: discord.Interaction, *_) -> None:
+        finish_app_command(interaction, failed=False)
 
     async def get_context(self, origin: Union[discord.Interaction, discord.Message], /, *, cls=Context) -> Context:
         return await super().get_context(origin, cls=cls)
@@ -60,9 +185,15 @@ class Millenia(commands.Bot):
 async def main():
     discord.utils.setup_logging()  # Could change this out for however you want logging to be setup
 
+    if LEAN_MODE:
+        profile = lean_profile(discover_extensions(), intents=INTENTS, max_messages=MAX_MESSAGES)
+    else:
+        profile = GatewayProfile.full()
+    log_profile(profile)
+
     async with (
         asqlite.create_pool(DB_FILENAME) as pool,
-        Millenia(command_prefix=COMMAND_PREFIX, pool=pool, intents=INTENTS) as bot,
+        Millenia(command_prefix=COMMAND_PREFIX, pool=pool, profile=profile) as bot,
     ):
         await bot.start(TOKEN)
 
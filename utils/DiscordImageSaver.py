@@ -1,41 +1,97 @@
+import asyncio
+import hashlib
+import logging
+import os
 import uuid
 from os import path
 
-import aiofiles
 import aiohttp
 
+from utils.lazy import lazy_import
+
+# Only needed once an image is actually downloaded.
+aiofiles = lazy_import("aiofiles")
+
+_logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=10)
+# Where Discord serves attachments from, slash command attachments live under ephemeral-attachments.
+ATTACHMENT_URL_PREFIXES = (
+    "https://cdn.discordapp.com/attachments/",
+    "https://cdn.discordapp.com/ephemeral-attachments/",
+    "https://media.discordapp.net/attachments/",
+    "https://media.discordapp.net/ephemeral-attachments/",
+)
+
+
+class ImageTooLarge(Exception):
+    """Raised when a download goes over its size limit."""
+
 
 class DiscordImageSaver:
-    def __init__(self, url, user_id, destination_directory):
+    def __init__(self, url, user_id, destination_directory, *, session: aiohttp.ClientSession, max_bytes=MAX_IMAGE_BYTES):
         self.url = url
         self.user_id = user_id
         self.destination_directory = destination_directory
+        self.session = session
+        self.max_bytes = max_bytes
         self.saved_image_name = None
+        self.content_hash = None
+        self.size = 0
 
     async def save_image_from_url(self):
-        """Download and saves an image from a `https://cdn.discordapp.com/attachments` url
+        """Download and saves an image from a Discord attachment url
+
+        The image is streamed to disk in chunks through the bot's shared session, and abandoned
+        if it turns out to be bigger than `max_bytes`. It's named after the SHA-256 of its contents,
+        so saving the same image twice only keeps one copy.
         """
 
-        if not self.url.startswith("https://cdn.discordapp.com/attachments/"):
+        if not self.url.startswith(ATTACHMENT_URL_PREFIXES):
             return
-        
+
+        image_extension = path.splitext(self.url.split("?", 1)[0])[-1]
+        # Written under a temporary name until the whole image is in and its hash is known.
+        destination_path = path.join(self.destination_directory, f".user_id-{self.user_id}-uuid{uuid.uuid4().hex}.part")
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.url) as response:
-                    if not response.status == 200:
-                        return
-                        
-                    image_extension = path.splitext(self.url)[-1]
-                    image_name = f"user_id-{self.user_id}-uuid{uuid.uuid4().hex}{image_extension}"
-                    destination_path = path.join(self.destination_directory, image_name)
+            async with self.session.get(self.url, timeout=DOWNLOAD_TIMEOUT) as response:
+                if not response.status == 200:
+                    return
+
+                # Trust the advertised length to bail early, but still count what actually arrives.
+                if response.content_length is not None and response.content_length > self.max_bytes:
+                    raise ImageTooLarge(f"{self.url} is {response.content_length:,} bytes")
+
+                written = 0
+                digest = hashlib.sha256()
+                async with aiofiles.open(destination_path, 'wb') as file:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        written += len(chunk)
+                        if written > self.max_bytes:
+                            raise ImageTooLarge(f"{self.url} is over {self.max_bytes:,} bytes")
+                        digest.update(chunk)
+                        await file.write(chunk)
 
-                    async with aiofiles.open(destination_path, 'wb') as file:
-                        await file.write(await response.read())
+            content_hash = digest.hexdigest()
+            image_name = f"{content_hash}{image_extension}"
+            # Replacing an identical copy is harmless, and leaves one file either way.
+            await asyncio.to_thread(os.replace, destination_path, path.join(self.destination_directory, image_name))
 
-                    self.saved_image_name = image_name
+            self.saved_image_name = image_name
+            self.content_hash = content_hash
+            self.size = written
 
-        except Exception as e:
-            print(f"An error occurred: {e}")
+        except ImageTooLarge as e:
+            _logger.warning("Not saving image, %s", e)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            _logger.exception("Failed to save image %s", self.url)
+        finally:
+            # Also runs when the download is cancelled, which none of the above catch.
+            if self.saved_image_name is None and path.exists(destination_path):
+                os.remove(destination_path)
 
     @property
     def image_name(self):
@@ -45,4 +101,4 @@ class DiscordImageSaver:
         -------
         `str | none`
         """
-        return self.saved_image_name
\ No newline at end of file
+        return self.saved_image_name
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    size: int = 0
+    max_size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class SizedTTLCache(Generic[K, V]):
+    """An in-process LRU cache bounded by the estimated size of its values in bytes.
+
+    Entries also expire ``ttl`` seconds after they were last stored, so anything changed
+    behind the cache's back is only ever stale for so long.
+
+    Parameters
+    ----------
+    max_bytes: int
+        The most bytes the cached values can add up to. The least recently used entries are
+        evicted to stay under it, and values bigger than it are never cached.
+    ttl: float
+        How long in seconds an entry stays valid after it was stored.
+    sizeof: Callable[[V], int]
+        Estimates the size of a value in bytes.
+    """
+
+    def __init__(self, *, max_bytes: int, ttl: float, sizeof: Callable[[V], int]) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+
+        # key -> (value, size, expires_at), least recently used first.
+        self._entries: OrderedDict[K, Tuple[V, int, float]] = OrderedDict()
+        self._size = 0
+        self._stats = CacheStats(max_size=max_bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return self._lookup(key) is not None
+
+    @property
+    def stats(self) -> CacheStats:
+        """:class:`CacheStats`: A snapshot of the cache's counters."""
+        stats = self._stats
+        return CacheStats(
+            stats.hits, stats.misses, stats.evictions, stats.expirations, len(self._entries), self._size, self.max_bytes
+        )
+
+    def _lookup(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, _, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self._stats.expirations += 1
+            return None
+
+        return value
+
+    def _remove(self, key: K) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def get(self, key: K) -> Optional[V]:
+        """Returns the value for ``key`` and marks it as recently used, or ``None`` on a miss."""
+        value = self._lookup(key)
+        if value is None:
+            self._stats.misses += 1
+            return None
+
+        self._stats.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def peek(self, key: K) -> Optional[V]:
+        """Returns the value for ``key`` without counting a hit or miss, or marking it as recently used."""
+        return self._lookup(key)
+
+    def set(self, key: K, value: V) -> None:
+        """Stores ``value`` under ``key``, evicting the least recently used entries to make room."""
+        if key in self._entries:
+            self._remove(key)
+
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        while self._entries and self._size + size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats.evictions += 1
+
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self._size += size
+
+    def update(self, key: K, updater: Callable[[V], V]) -> bool:
+        """Replaces the value for ``key`` with ``updater(value)``, if ``key`` is cached.
+
+        Returns
+        -------
+        `bool`
+            Whether ``key`` was cached.
+        """
+        value = self._lookup(key)
+        if value is None:
+            return False
+
+        self.set(key, updater(value))
+        return True
+
+    def invalidate(self, key: K) -> None:
+        """Drops ``key`` from the cache, if it's there."""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
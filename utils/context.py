@@ -1,21 +1,92 @@
 """
 The subclasses contained in here should be used instead of the normal commands.Context.
 GuildContext is useful for guild_only commands.
+
+Every reply sent through :meth:`Context.send` is remembered against the message that invoked the command, so when
+that message is edited to run the command again the earlier replies are edited in place instead of sent again.
 """
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Union
+import time
+from typing import TYPE_CHECKING, Any, List, Optional, Union
 
 import discord
 from discord.ext import commands
 
+from utils.cache import SizedTTLCache
+
 if TYPE_CHECKING:
     from millenia import Millenia
 
+# How many invoking messages' replies are remembered, and for how long.
+RESPONSE_CACHE_SIZE = 1000
+RESPONSE_CACHE_TTL = 60 * 60
+
+# Sends that an edit can't reproduce, the earlier reply is deleted and a new one sent instead.
+NOT_EDITABLE = ("tts", "stickers", "suppress_embeds", "silent", "poll")
+
+
+def response_cache() -> SizedTTLCache[int, List[int]]:
+    """Maps an invoking message's id to the ids of the replies it got, bounded by the total amount of replies."""
+    return SizedTTLCache(max_bytes=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, sizeof=len)
+
 
 class Context(commands.Context):
     bot: Millenia
 
+    def __init__(self, **attrs: Any) -> None:
+        super().__init__(**attrs)
+        # Replies from the last time this message ran a command, handed out in order to be edited.
+        self.reusable_responses: List[int] = []
+        self._responses: List[int] = []
+        # When parsing the message for a command started, and the command counted as in flight while it runs.
+        self.started_at = time.perf_counter()
+        self.tracked_command: Optional[str] = None
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> discord.Message:
+        if self.interaction is not None:
+            return await super().send(content, **kwargs)
+
+        message = None
+        while message is None and self.reusable_responses:
+            message = await self._edit_response(self.reusable_responses.pop(0), content, kwargs)
+        if message is None:
+            message = await super().send(content, **kwargs)
+
+        self._responses.append(message.id)
+        self.bot.responses.set(self.message.id, self._responses)
+        return message
+
+    async def _edit_response(self, message_id: int, content: Optional[str], kwargs: Any) -> Optional[discord.Message]:
+        response = self.channel.get_partial_message(message_id)
+        try:
+            if any(kwargs.get(name) for name in NOT_EDITABLE):
+                await response.delete()
+                return None
+
+            embed, file = kwargs.get("embed"), kwargs.get("file")
+            # Anything left out is cleared, the reply should look as though it was just sent.
+            return await response.edit(
+                content=content,
+                embeds=kwargs.get("embeds") or ([embed] if embed else []),
+                attachments=kwargs.get("files") or ([file] if file else []),
+                view=kwargs.get("view"),
+                delete_after=kwargs.get("delete_after"),
+                allowed_mentions=kwargs.get("allowed_mentions"),
+            )
+        except discord.NotFound:
+            return None
+
+    async def discard_unused_responses(self) -> None:
+        """|coro|
+        Deletes the earlier replies this run didn't reuse.
+        """
+        while self.reusable_responses:
+            try:
+                await self.channel.get_partial_message(self.reusable_responses.pop()).delete()
+            except discord.NotFound:
+                pass
+
 
 class GuildContext(Context):
     author: discord.Member
@@ -0,0 +1,144 @@
+"""
+Captioning animated GIFs one frame at a time.
+
+Pillow's own GIF writer collects every frame before writing any of them, so frames are encoded here as they're
+decoded instead: decode a frame, draw the caption onto it, quantize it and write it out, then move on to the next.
+Only one decoded frame, plus the output written so far, is ever held in memory, and a :class:`FrameBudget` caps both.
+"""
+from __future__ import annotations
+
+from typing import IO, NamedTuple, Sequence, Tuple, Union
+
+from utils.lazy import lazy_import
+from utils.meme_layout import TextBox, draw_text
+
+GifImagePlugin = lazy_import("PIL.GifImagePlugin")
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageSequence = lazy_import("PIL.ImageSequence")
+
+
+class FrameBudget(NamedTuple):
+    max_frames: int = 300
+    max_pixels: int = 1024 * 1024
+    max_output_bytes: int = 8 * 1024 * 1024
+
+
+class FrameBudgetExceeded(Exception):
+    """Raised when an animation would go over its :class:`FrameBudget`."""
+
+
+def caption_boxes(size: Tuple[int, int], /) -> Tuple[TextBox, TextBox]:
+    """Top and bottom caption boxes scaled to an image of ``size``."""
+    width, height = size
+    margin = max(width // 40, 2)
+    box_height = height // 4
+    max_font_size = max(height // 8, 12)
+    min_font_size = min(10, max_font_size)
+    stroke_width = max(max_font_size // 25, 1)
+
+    common = dict(
+        x=margin,
+        width=width - 2 * margin,
+        height=box_height,
+        min_font_size=min_font_size,
+        max_font_size=max_font_size,
+        stroke_width=stroke_width,
+    )
+    return (
+        TextBox(y=margin, valign="top", **common),
+        TextBox(y=height - margin - box_height, valign="bottom", **common),
+    )
+
+
+def render_overlay(size: Tuple[int, int], boxes: Sequence[TextBox], texts: Sequence[str], font_path: str) -> Image.Image:
+    """Draws ``texts`` into ``boxes`` on a transparent layer, so the layout is only worked out once per animation."""
+    overlay = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    for box, text in zip(boxes, texts):
+        if text:
+            draw_text(draw, text, box, font_path)
+    return overlay
+
+
+class _BoundedWriter:
+    def __init__(self, fp: IO[bytes], limit: int) -> None:
+        self.fp = fp
+        self.limit = limit
+        self.written = 0
+
+    def write(self, chunks: Sequence[bytes]) -> None:
+        for chunk in chunks:
+            self.written += len(chunk)
+            if self.written > self.limit:
+                raise FrameBudgetExceeded(f"The captioned GIF would be over {self.limit:,} bytes")
+            self.fp.write(chunk)
+
+
+def caption_animation(
+    source: Union[str, IO[bytes]],
+    texts: Sequence[str],
+    font_path: str,
+    fp: IO[bytes],
+    /,
+    *,
+    boxes: Sequence[TextBox] | None = None,
+    budget: FrameBudget = FrameBudget(),
+) -> int:
+    """Captions the animation at ``source`` and streams it as a GIF into ``fp``.
+
+    Parameters
+    ----------
+    source: Union[str, IO[bytes]]
+        A path to, or file object holding, the animation to caption.
+    texts: Sequence[str]
+        The text for each box.
+    font_path: str
+        The font to draw the text with.
+    fp: IO[bytes]
+        Where the captioned GIF is written.
+    boxes: Sequence[TextBox] | None
+        The boxes the text goes in, by default :func:`caption_boxes` for the animation's size.
+    budget: :class:`FrameBudget`
+        The limits on the animation.
+
+    Returns
+    -------
+    `int`
+        The amount of frames written.
+
+    Raises
+    ------
+    `FrameBudgetExceeded`
+        The animation has too many frames, too many pixels per frame, or the output got too big.
+    """
+    writer = _BoundedWriter(fp, budget.max_output_bytes)
+
+    with Image.open(source) as animation:
+        width, height = animation.size
+        if width * height > budget.max_pixels:
+            raise FrameBudgetExceeded(f"Frames are {width}x{height}, over the {budget.max_pixels:,} pixel limit")
+
+        overlay = render_overlay(animation.size, boxes or caption_boxes(animation.size), texts, font_path)
+        loop = animation.info.get("loop", 0)
+
+        frames = 0
+        for frame in ImageSequence.Iterator(animation):
+            if frames >= budget.max_frames:
+                raise FrameBudgetExceeded(f"The animation is over the {budget.max_frames} frame limit")
+
+            composed = frame.convert("RGBA")
+            composed.alpha_composite(overlay)
+            quantized = composed.convert("RGB").quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            del composed
+
+            if frames == 0:
+                header, _ = GifImagePlugin.getheader(quantized, info={"loop": loop})
+                writer.write(header)
+
+            duration = frame.info.get("duration", 100)
+            writer.write(GifImagePlugin.getdata(quantized, duration=duration, include_color_table=True))
+            frames += 1
+
+    writer.write([b";"])
+    return frames
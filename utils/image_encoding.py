@@ -0,0 +1,130 @@
+"""
+Encodes generated images as small as they can be while still looking fine.
+
+Every allowed format is tried. Lossy formats start at their best quality and, when that's over the target size,
+have their quality binary searched down towards the quality floor for the best quality that fits. The smallest
+result wins. Encoding happens in the render workers, so the buffers written into are pooled per process.
+"""
+from __future__ import annotations
+
+import io
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from utils.lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+LOSSY_FORMATS = ("webp", "jpeg")
+EXTENSIONS = {"webp": "webp", "jpeg": "jpeg", "png": "png", "gif": "gif"}
+
+
+class EncodingOptions(NamedTuple):
+    formats: Tuple[str, ...] = ("webp", "jpeg", "png")
+    quality_floor: int = 70
+    max_quality: int = 90
+    target_bytes: Optional[int] = 512 * 1024
+    # 0 is the fastest WebP effort level, the slower ones only save a few more percent.
+    webp_method: int = 0
+
+
+class EncodedImage(NamedTuple):
+    data: bytes
+    format: str
+    quality: Optional[int]
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+
+class BufferPool:
+    """Hands out :class:`io.BytesIO` buffers, reusing the ones that were given back."""
+
+    def __init__(self, max_buffers: int = 4) -> None:
+        self.max_buffers = max_buffers
+        self._free: List[io.BytesIO] = []
+
+    @contextmanager
+    def buffer(self) -> Iterator[io.BytesIO]:
+        buff = self._free.pop() if self._free else io.BytesIO()
+        try:
+            yield buff
+        finally:
+            buff.seek(0)
+            buff.truncate()
+            if len(self._free) < self.max_buffers:
+                self._free.append(buff)
+
+
+_buffers = BufferPool()
+
+
+def guess_format(data: bytes, /) -> str:
+    """Works out the format of encoded image ``data`` from its signature."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return "jpeg"
+
+
+def _save(img: Image.Image, image_format: str, quality: Optional[int], /, *, webp_method: int = 0) -> bytes:
+    with _buffers.buffer() as buff:
+        if image_format == "png":
+            img.save(buff, format="png", optimize=True)
+        elif image_format == "webp":
+            img.save(buff, format="webp", quality=quality, method=webp_method)
+        else:
+            img.convert("RGB").save(buff, format="jpeg", quality=quality, optimize=True)
+        return buff.getvalue()
+
+
+def _encode_lossy(img: Image.Image, image_format: str, options: EncodingOptions, /) -> EncodedImage:
+    def encode(quality: int) -> EncodedImage:
+        return EncodedImage(_save(img, image_format, quality, webp_method=options.webp_method), image_format, quality)
+
+    encoded = encode(options.max_quality)
+    if options.target_bytes is None or len(encoded.data) <= options.target_bytes:
+        return encoded
+
+    # Best quality is too big, find the best quality that fits, or settle for the floor.
+    low, high = options.quality_floor, options.max_quality - 1
+    best: Optional[EncodedImage] = None
+    at_floor: Optional[EncodedImage] = None
+    while low <= high:
+        quality = (low + high) // 2
+        encoded = encode(quality)
+        if len(encoded.data) <= options.target_bytes:
+            best = encoded
+            low = quality + 1
+        else:
+            if quality == options.quality_floor:
+                at_floor = encoded
+            high = quality - 1
+
+    return best or at_floor or encode(options.quality_floor)
+
+
+def encode_image(img: Image.Image, options: EncodingOptions = EncodingOptions(), /) -> EncodedImage:
+    """Encodes ``img`` in each of the allowed formats and returns the smallest.
+
+    Nothing is encoded below ``options.quality_floor``, so the result may still be over ``options.target_bytes``.
+    """
+    candidates = []
+    lossy = [image_format for image_format in options.formats if image_format in LOSSY_FORMATS]
+    for image_format in lossy:
+        candidates.append(_encode_lossy(img, image_format, options))
+
+    if "png" in options.formats:
+        # Lossless PNG only has a chance at being smallest for images with few colors, like drawings,
+        # so photos skip the slow encode unless PNG is the only choice.
+        colors = img.getcolors(maxcolors=256)
+        if colors is not None:
+            candidates.append(EncodedImage(_save(img.quantize(len(colors)), "png", None), "png", None))
+        elif not lossy:
+            candidates.append(EncodedImage(_save(img, "png", None), "png", None))
+
+    return min(candidates, key=lambda encoded: len(encoded.data))
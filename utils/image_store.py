@@ -0,0 +1,240 @@
+"""
+A content-addressed store of downloaded images.
+
+Images are saved once per distinct content, named after the SHA-256 of their bytes, and indexed in the ``images``
+table along with who saved them, their size and when they were last used. The URLs they came from are remembered
+too, so a cog holding an attachment that was downloaded before gets the file on disk back instead of fetching it
+again. Cogs read attachments through :meth:`ImageStore.read_attachment`, so the same image upscaled or captioned
+again is read from disk rather than downloaded again. A background task deletes the least recently used images
+once the store grows past its quota.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import pathlib
+import time
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from utils.DiscordImageSaver import DiscordImageSaver
+
+if TYPE_CHECKING:
+    import aiohttp
+    import asqlite
+    import discord
+
+_logger = logging.getLogger(__name__)
+
+IMAGE_STORE_DIRECTORY = pathlib.Path("cache/images")
+
+
+def source_key(url: str, /) -> str:
+    """The part of an attachment URL that stays the same, Discord signs its CDN URLs with an expiring query string."""
+    return url.split("?", 1)[0]
+
+
+class StoredImage(NamedTuple):
+    hash: str
+    path: pathlib.Path
+    size: int
+
+
+class ImageStore:
+    """Downloads images into ``directory``, keeping one file per distinct image.
+
+    Parameters
+    ----------
+    pool: :class:`asqlite.Pool`
+        The pool holding the ``images`` tables.
+    session: :class:`aiohttp.ClientSession`
+        The session images are downloaded with.
+    directory: :class:`pathlib.Path`
+        Where the images are kept.
+    max_bytes: int
+        The disk quota. Past it, the least recently used images are deleted until the store is under 90% of it.
+    eviction_interval: float
+        How often in seconds the store is checked against its quota.
+    """
+
+    def __init__(
+        self,
+        pool: asqlite.Pool,
+        session: aiohttp.ClientSession,
+        directory: pathlib.Path = IMAGE_STORE_DIRECTORY,
+        *,
+        max_bytes: int = 1024 * 1024 * 1024,
+        eviction_interval: float = 10 * 60,
+    ) -> None:
+        self.pool = pool
+        self.session = session
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.eviction_interval = eviction_interval
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        """Starts the background eviction. Must be called from within the running event loop."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="image-store-eviction")
+
+    async def close(self) -> None:
+        """|coro|
+        Stops the background eviction, letting one that's already running finish first.
+        """
+        self._closing.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.eviction_interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                return
+
+            try:
+                await self.evict()
+            except Exception:
+                _logger.exception("Failed to evict images from the store")
+
+    async def get(self, content_hash: str, /) -> Optional[StoredImage]:
+        """|coro|
+        Returns the stored image with the SHA-256 ``content_hash``, or ``None`` if it isn't stored.
+        """
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchone("SELECT hash, filename, size FROM images WHERE hash = ?", content_hash)
+            return await self._touch(conn, row)
+
+    async def lookup(self, url: str, /) -> Optional[StoredImage]:
+        """|coro|
+        Returns the image that was downloaded from ``url`` before, or ``None`` if it wasn't or has been evicted since.
+        """
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchone(
+                """SELECT images.hash, images.filename, images.size
+                FROM image_sources INNER JOIN images ON images.hash = image_sources.hash
+                WHERE image_sources.source = ?""",
+                source_key(url),
+            )
+            return await self._touch(conn, row)
+
+    async def _touch(self, conn: asqlite.Connection, row, /) -> Optional[StoredImage]:
+        if row is None:
+            return None
+
+        path = self.directory / row["filename"]
+        if not await asyncio.to_thread(path.exists):
+            # Deleted behind the store's back, forget about it so it gets downloaded again.
+            await conn.execute("DELETE FROM images WHERE hash = ?", row["hash"])
+            return None
+
+        await conn.execute("UPDATE images SET last_accessed_at = ? WHERE hash = ?", time.time(), row["hash"])
+        return StoredImage(row["hash"], path, row["size"])
+
+    async def fetch(self, url: str, owner_id: int, /) -> Optional[StoredImage]:
+        """|coro|
+        Returns the image at the Discord attachment ``url``, downloading it only if it isn't stored already.
+
+        Returns
+        -------
+        Optional[:class:`StoredImage`]
+            The image, or ``None`` if it couldn't be downloaded.
+        """
+        stored = await self.lookup(url)
+        if stored is not None:
+            async with self.pool.acquire() as conn:
+                await conn.execute(
+                    "INSERT OR IGNORE INTO image_owners(hash, owner_id) VALUES (?, ?)",
+                    stored.hash,
+                    owner_id,
+                )
+            return stored
+
+        saver = DiscordImageSaver(url, owner_id, self.directory, session=self.session)
+        await saver.save_image_from_url()
+        if saver.image_name is None:
+            return None
+
+        now = time.time()
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """INSERT INTO images(hash, filename, size, created_at, last_accessed_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(hash) DO UPDATE SET last_accessed_at = excluded.last_accessed_at""",
+                saver.content_hash,
+                saver.image_name,
+                saver.size,
+                now,
+                now,
+            )
+            await conn.execute(
+                "INSERT OR IGNORE INTO image_owners(hash, owner_id) VALUES (?, ?)", saver.content_hash, owner_id
+            )
+            await conn.execute(
+                "INSERT OR REPLACE INTO image_sources(source, hash) VALUES (?, ?)", source_key(url), saver.content_hash
+            )
+            row = await conn.fetchone("SELECT filename FROM images WHERE hash = ?", saver.content_hash)
+
+        # The same image saved under another extension earlier keeps its first name, drop the new copy.
+        if row["filename"] != saver.image_name:
+            await asyncio.to_thread((self.directory / saver.image_name).unlink, missing_ok=True)
+
+        return StoredImage(saver.content_hash, self.directory / row["filename"], saver.size)
+
+    async def read_attachment(self, attachment: discord.Attachment, owner_id: int, /) -> bytes:
+        """|coro|
+        The bytes of ``attachment``, through the store. Read straight from Discord if it can't be stored.
+        """
+        # Eviction can delete the file between fetching and reading it, fetching again downloads it again.
+        for _ in range(2):
+            stored = await self.fetch(attachment.url, owner_id)
+            if stored is None:
+                break
+            try:
+                return await asyncio.to_thread(stored.path.read_bytes)
+            except FileNotFoundError:
+                continue
+        return await attachment.read()
+
+    async def evict(self) -> int:
+        """|coro|
+        Deletes the least recently used images while the store is over its quota.
+
+        Returns
+        -------
+        `int`
+            The amount of images deleted.
+        """
+        async with self.pool.acquire() as conn:
+            total = await conn.fetchone("SELECT COALESCE(SUM(size), 0) AS size FROM images")
+            size = total["size"]
+            if size <= self.max_bytes:
+                return 0
+
+            target = self.max_bytes * 0.9
+            evicted = []
+            rows = await conn.fetchall("SELECT hash, filename, size FROM images ORDER BY last_accessed_at")
+            for row in rows:
+                if size <= target:
+                    break
+                evicted.append(row)
+                size -= row["size"]
+
+            # Owners and sources go with their image.
+            await conn.executemany("DELETE FROM images WHERE hash = ?", [(row["hash"],) for row in evicted])
+
+        def unlink() -> None:
+            for row in evicted:
+                try:
+                    os.remove(self.directory / row["filename"])
+                except FileNotFoundError:
+                    pass
+
+        await asyncio.to_thread(unlink)
+        _logger.info("Evicted %d images from the store", len(evicted))
+        return len(evicted)
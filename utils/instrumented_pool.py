@@ -0,0 +1,268 @@
+"""
+An :class:`asqlite.Pool` that keeps statistics about how it's used.
+
+:class:`InstrumentedPool` stands in for the pool on ``bot.pool``, so cogs keep acquiring connections and calling
+``execute``, ``fetchone`` and the rest on them as before. Behind them it records how long each acquire waited for a
+connection, how long each statement took and how many rows it returned, and how long commits took. Statements are
+grouped by their normalized SQL, with literals and ``IN`` lists collapsed, so the same query with different values
+counts once.
+
+A statement slower than the threshold goes into the slow query log, and the first time a statement is slow its
+``EXPLAIN QUERY PLAN`` is captured along with it.
+"""
+from __future__ import annotations
+
+import collections
+import datetime
+import functools
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Deque, Dict, Generator, Optional
+
+import discord
+
+from utils.metrics import LatencyHistogram
+
+if TYPE_CHECKING:
+    import asqlite
+
+_logger = logging.getLogger(__name__)
+
+# Most statements take well under a millisecond, so the buckets start much lower than the commands' do.
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Past this many distinct statements the rest are counted together, in case something builds SQL dynamically.
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "(other statements)"
+
+_COMMENT_RE = re.compile(r"--[^\n]*")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql: str, /) -> str:
+    """``sql`` on one line without comments, its literals replaced by ``?`` and lists of placeholders collapsed to
+    ``(...)``.
+    """
+    normalized = _LITERAL_RE.sub("?", " ".join(_COMMENT_RE.sub("", sql).split()))
+    return _PLACEHOLDER_LIST_RE.sub("(...)", normalized)
+
+
+@dataclass(slots=True)
+class StatementStats:
+    latency: LatencyHistogram = field(default_factory=lambda: LatencyHistogram(QUERY_BUCKETS))
+    rows: int = 0
+    errors: int = 0
+    plan: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class SlowQuery:
+    at: datetime.datetime
+    sql: str
+    duration: float
+    plan: Optional[str]
+
+
+class QueryStats:
+    """Everything :class:`InstrumentedPool` has recorded.
+
+    Attributes
+    ----------
+    acquire_wait: :class:`LatencyHistogram`
+        How long acquiring a connection took.
+    commits: :class:`LatencyHistogram`
+        How long commits took.
+    statements: Dict[str, :class:`StatementStats`]
+        Each normalized statement's stats.
+    slow: Deque[:class:`SlowQuery`]
+        The most recent statements slower than ``slow_threshold``, oldest first.
+    """
+
+    def __init__(self, *, slow_threshold: float, slow_log_size: int) -> None:
+        self.slow_threshold = slow_threshold
+        self.acquire_wait = LatencyHistogram(QUERY_BUCKETS)
+        self.commits = LatencyHistogram(QUERY_BUCKETS)
+        self.statements: Dict[str, StatementStats] = {}
+        self.slow: Deque[SlowQuery] = collections.deque(maxlen=slow_log_size)
+
+    def statement(self, sql: str, /) -> StatementStats:
+        key = normalize_sql(sql)
+        stats = self.statements.get(key)
+        if stats is None:
+            if len(self.statements) >= MAX_STATEMENTS:
+                key = OTHER_STATEMENTS
+                stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = StatementStats()
+        return stats
+
+
+class InstrumentedConnection:
+    """Wraps a pooled connection, timing its statements and commits. Anything else goes straight to the connection."""
+
+    def __init__(self, connection: asqlite.ProxiedConnection, stats: QueryStats) -> None:
+        self._connection = connection
+        self._stats = stats
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    def execute(self, sql: str, /, *parameters: Any) -> _TimedStatement:
+        return _TimedStatement(self, sql, parameters, self._connection.execute(sql, *parameters))
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> _TimedStatement:
+        return _TimedStatement(self, sql, None, self._connection.executemany(sql, seq_of_parameters))
+
+    def executescript(self, sql_script: str) -> _TimedStatement:
+        return _TimedStatement(self, sql_script, None, self._connection.executescript(sql_script))
+
+    async def fetchone(self, query: str, *parameters: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            row = await self._connection.fetchone(query, *parameters)
+        except Exception:
+            self._stats.statement(query).errors += 1
+            raise
+        await self._record(query, parameters, time.perf_counter() - start, 0 if row is None else 1)
+        return row
+
+    async def fetchall(self, query: str, /, *parameters: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            rows = await self._connection.fetchall(query, *parameters)
+        except Exception:
+            self._stats.statement(query).errors += 1
+            raise
+        await self._record(query, parameters, time.perf_counter() - start, len(rows))
+        return rows
+
+    async def fetchmany(self, query: str, /, *parameters: Any, size: Optional[int] = None) -> Any:
+        start = time.perf_counter()
+        try:
+            rows = await self._connection.fetchmany(query, *parameters, size=size)
+        except Exception:
+            self._stats.statement(query).errors += 1
+            raise
+        await self._record(query, parameters, time.perf_counter() - start, len(rows))
+        return rows
+
+    async def commit(self) -> None:
+        start = time.perf_counter()
+        try:
+            await self._connection.commit()
+        finally:
+            self._stats.commits.observe(time.perf_counter() - start)
+
+    async def _record(self, sql: str, parameters: Any, duration: float, rows: int, /) -> None:
+        stats = self._stats.statement(sql)
+        stats.latency.observe(duration)
+        stats.rows += rows
+
+        if duration < self._stats.slow_threshold:
+            return
+
+        if stats.plan is None and parameters is not None and _EXPLAINABLE_RE.match(sql):
+            stats.plan = await self._explain(sql, parameters)
+
+        self._stats.slow.append(SlowQuery(discord.utils.utcnow(), normalize_sql(sql), duration, stats.plan))
+        _logger.warning("Slow query (%.0fms): %s", duration * 1000, normalize_sql(sql))
+
+    async def _explain(self, sql: str, parameters: Any, /) -> str:
+        try:
+            rows = await self._connection.fetchall(f"EXPLAIN QUERY PLAN {sql}", *parameters)
+        except Exception as e:
+            return f"Couldn't explain it: {e}"
+
+        # Each step names its parent, indent them under it.
+        depths: Dict[int, int] = {}
+        lines = []
+        for row in rows:
+            depth = depths[row["id"]] = depths.get(row["parent"], -1) + 1
+            lines.append(f"{'  ' * depth}{row['detail']}")
+        return "\n".join(lines)
+
+
+class _TimedStatement:
+    """Times an asqlite statement whether it's awaited or used with ``async with``, like the one it wraps."""
+
+    def __init__(self, connection: InstrumentedConnection, sql: str, parameters: Any, statement: Any) -> None:
+        self._connection = connection
+        self._sql = sql
+        self._parameters = parameters
+        self._statement = statement
+
+    async def _run(self, runner: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await runner
+        except Exception:
+            self._connection._stats.statement(self._sql).errors += 1
+            raise
+        await self._connection._record(self._sql, self._parameters, time.perf_counter() - start, 0)
+        return result
+
+    def __await__(self) -> Generator[Any, None, Any]:
+        return self._run(self._statement).__await__()
+
+    async def __aenter__(self) -> Any:
+        return await self._run(self._statement.__aenter__())
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._statement.__aexit__(*exc_info)
+
+
+class _TimedAcquire:
+    def __init__(self, pool: InstrumentedPool) -> None:
+        self._pool = pool
+        self._connection: Optional[InstrumentedConnection] = None
+
+    async def _acquire(self) -> InstrumentedConnection:
+        start = time.perf_counter()
+        connection = await self._pool.pool.acquire()
+        self._pool.stats.acquire_wait.observe(time.perf_counter() - start)
+        return InstrumentedConnection(connection, self._pool.stats)
+
+    def __await__(self) -> Generator[Any, None, InstrumentedConnection]:
+        return self._acquire().__await__()
+
+    async def __aenter__(self) -> InstrumentedConnection:
+        self._connection = await self._acquire()
+        return self._connection
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self._connection is not None:
+            await self._pool.release(self._connection)
+            self._connection = None
+
+
+class InstrumentedPool:
+    """Wraps ``pool``, recording its use in :attr:`stats`.
+
+    Parameters
+    ----------
+    pool: :class:`asqlite.Pool`
+        The pool to wrap.
+    slow_threshold: float
+        How long in seconds a statement takes before it's logged as slow.
+    slow_log_size: int
+        How many slow statements are kept.
+    """
+
+    def __init__(self, pool: asqlite.Pool, *, slow_threshold: float = 0.1, slow_log_size: int = 50) -> None:
+        self.pool = pool
+        self.stats = QueryStats(slow_threshold=slow_threshold, slow_log_size=slow_log_size)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+    def acquire(self) -> _TimedAcquire:
+        """Acquires a connection, awaited or with ``async with`` like :meth:`asqlite.Pool.acquire`."""
+        return _TimedAcquire(self)
+
+    async def release(self, connection: InstrumentedConnection) -> None:
+        await self.pool.release(connection._connection)
@@ -0,0 +1,178 @@
+"""
+Works out which gateway intents and caches the bot needs from the extensions it loads.
+
+``discord.Intents.all()`` has Discord send every presence change and typing notification and makes discord.py
+download and keep every member of every server, none of which the cogs use. In lean mode each extension declares
+what it relies on instead, next to its other module level declarations:
+
+.. code-block:: python
+
+    INTENTS = ("guild_reactions",)
+    MEMBER_CACHE = ()
+    MAX_MESSAGES = 0
+
+``INTENTS`` and ``MEMBER_CACHE`` name :class:`discord.Intents` and :class:`discord.MemberCacheFlags` flags,
+``MAX_MESSAGES`` is how many messages the extension needs discord.py to keep around. The bot runs with the union
+of what its own code and every extension asked for, and nothing else.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from utils.startup import ExtensionSpec, read_declarations
+
+_logger = logging.getLogger(__name__)
+
+DECLARATIONS = ("INTENTS", "MEMBER_CACHE", "MAX_MESSAGES")
+
+# Measured with tracemalloc, a cached Member and its User come to a bit under 1 KiB before any presence data.
+APPROX_MEMBER_BYTES = 1024
+
+# The gateway events each intent subscribes to that the busiest servers send the most of.
+NOISY_EVENTS = {
+    "members": ("GUILD_MEMBERS_CHUNK", "GUILD_MEMBER_ADD", "GUILD_MEMBER_UPDATE", "GUILD_MEMBER_REMOVE"),
+    "presences": ("PRESENCE_UPDATE",),
+    "guild_typing": ("TYPING_START",),
+    "dm_typing": ("TYPING_START",),
+    "voice_states": ("VOICE_STATE_UPDATE",),
+}
+
+# A member cache flag is only any use with the intent that keeps it up to date.
+MEMBER_CACHE_INTENTS = {"joined": "members", "voice": "voice_states"}
+
+
+@dataclass(frozen=True, slots=True)
+class GatewayProfile:
+    """The intents and caches the bot connects with.
+
+    Attributes
+    ----------
+    intents: :class:`discord.Intents`
+        The intents to identify with.
+    member_cache_flags: :class:`discord.MemberCacheFlags`
+        Which members to cache.
+    max_messages: Optional[int]
+        How many messages to cache, ``None`` to cache none.
+    requested_by: Dict[str, Tuple[str, ...]]
+        Each enabled intent and member cache flag, and the modules that asked for it.
+    """
+
+    intents: discord.Intents
+    member_cache_flags: discord.MemberCacheFlags
+    max_messages: Optional[int]
+    requested_by: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+    @classmethod
+    def full(cls) -> GatewayProfile:
+        """Every intent and discord.py's default caches, what the bot ran with before lean mode."""
+        intents = discord.Intents.all()
+        return cls(intents, discord.MemberCacheFlags.from_intents(intents), 1000)
+
+    @property
+    def chunk_guilds_at_startup(self) -> bool:
+        return self.member_cache_flags.joined
+
+    def options(self) -> Dict[str, Any]:
+        """Keyword arguments for :class:`discord.Client` that connect with this profile."""
+        return {
+            "intents": self.intents,
+            "member_cache_flags": self.member_cache_flags,
+            "max_messages": self.max_messages,
+            "chunk_guilds_at_startup": self.chunk_guilds_at_startup,
+        }
+
+    def dropped_intents(self) -> List[str]:
+        """The intents :meth:`full` enables that this doesn't."""
+        return [name for name, enabled in discord.Intents.all() if enabled and not getattr(self.intents, name)]
+
+    def dropped_events(self) -> List[str]:
+        """The high volume gateway events Discord won't send with this profile."""
+        kept = {event for name, events in NOISY_EVENTS.items() if getattr(self.intents, name) for event in events}
+        dropped = {event for name in self.dropped_intents() for event in NOISY_EVENTS.get(name, ())}
+        return sorted(dropped - kept)
+
+
+def lean_profile(
+    specs: Iterable[ExtensionSpec],
+    /,
+    *,
+    intents: Iterable[str] = (),
+    member_cache: Iterable[str] = (),
+    max_messages: int = 0,
+) -> GatewayProfile:
+    """The smallest profile that covers ``specs``' declarations and the bot's own ``intents``, ``member_cache``
+    and ``max_messages``.
+
+    Raises
+    ------
+    `ValueError`
+        A declaration names a flag that doesn't exist, or a member cache flag without its intent.
+    """
+    requested: Dict[str, List[str]] = {}
+    flags: Dict[str, List[str]] = {}
+
+    def request(into: Dict[str, List[str]], valid: Dict[str, int], names: Iterable[str], module: str) -> None:
+        for name in names:
+            if name not in valid:
+                raise ValueError(f"{module} asks for {name!r}, which isn't a flag")
+            into.setdefault(name, []).append(module)
+
+    request(requested, discord.Intents.VALID_FLAGS, intents, "the bot")
+    request(flags, discord.MemberCacheFlags.VALID_FLAGS, member_cache, "the bot")
+
+    for spec in specs:
+        declarations = read_declarations(spec.path, DECLARATIONS)
+        request(requested, discord.Intents.VALID_FLAGS, declarations.get("INTENTS", ()), spec.name)
+        request(flags, discord.MemberCacheFlags.VALID_FLAGS, declarations.get("MEMBER_CACHE", ()), spec.name)
+        max_messages = max(max_messages, declarations.get("MAX_MESSAGES", 0))
+
+    for name, modules in flags.items():
+        intent = MEMBER_CACHE_INTENTS[name]
+        if intent not in requested:
+            raise ValueError(f"{', '.join(modules)} caches {name} members without asking for the {intent} intent")
+
+    return GatewayProfile(
+        discord.Intents(**dict.fromkeys(requested, True)),
+        discord.MemberCacheFlags(**{name: name in flags for name in discord.MemberCacheFlags.VALID_FLAGS}),
+        max_messages or None,
+        {name: tuple(modules) for name, modules in (requested | flags).items()},
+    )
+
+
+def log_profile(profile: GatewayProfile, /) -> None:
+    """Logs what ``profile`` turns off compared to :meth:`GatewayProfile.full`."""
+    dropped = profile.dropped_intents()
+    if not dropped:
+        _logger.info("Connecting with every intent")
+        return
+
+    enabled = ", ".join(f"{name} ({', '.join(modules)})" for name, modules in profile.requested_by.items())
+    _logger.info("Lean mode: connecting with %s", enabled)
+    _logger.info(
+        "Lean mode: not subscribed to %s, so Discord won't send %s",
+        ", ".join(dropped),
+        ", ".join(profile.dropped_events()) or "any of the busiest events",
+    )
+
+
+def log_savings(profile: GatewayProfile, guilds: Iterable[discord.Guild], /) -> None:
+    """Logs roughly how many members ``profile`` kept out of memory and off the gateway across ``guilds``."""
+    if profile.chunk_guilds_at_startup:
+        return
+
+    total = cached = 0
+    for guild in guilds:
+        total += guild.member_count or 0
+        cached += len(guild.members)
+
+    skipped = max(total - cached, 0)
+    _logger.info(
+        "Lean mode: not downloading or caching %s of %s members, about %.1f MiB less memory",
+        f"{skipped:,}",
+        f"{total:,}",
+        skipped * APPROX_MEMBER_BYTES / (1024 * 1024),
+    )
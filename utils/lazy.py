@@ -0,0 +1,51 @@
+"""
+Imports that wait until they're used.
+
+Pillow, replicate and aiofiles only matter once their commands run, yet importing them eagerly adds to every
+startup. :func:`lazy_import` hands back the module straight away but only runs it the first time one of its
+attributes is looked up:
+
+.. code-block:: python
+
+    Image = lazy_import("PIL.Image")
+
+    def render():
+        return Image.new("RGB", (1, 1))  # PIL.Image is imported here.
+
+Don't ``from module import name`` a lazy module's names at import time, that looks them up and imports it anyway.
+"""
+from __future__ import annotations
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str, /) -> ModuleType:
+    """Returns the module ``name``, imported on first attribute access unless it's been imported already.
+
+    Raises
+    ------
+    `ModuleNotFoundError`
+        There's no module called ``name``.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    # A normal import also sets submodules on their package, so `import PIL.Image` users still find it.
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+
+    return module
@@ -0,0 +1,188 @@
+"""
+Watches the event loop for callbacks that block it.
+
+The gateway heartbeat, every command and every timer share one event loop, so a callback doing blocking work stalls
+all of them. :class:`LoopMonitor` runs a task that sleeps for a fixed interval and measures how late it wakes up, the
+loop's lag. A watchdog thread keeps an eye on that task too: when it hasn't woken for longer than the threshold, the
+thread grabs the stack the loop is stuck in and the task running it. Once the loop gets going again the stall is
+logged and kept in a ring buffer as a :class:`SlowCallback`.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Deque, Optional, Tuple
+
+import discord
+
+_logger = logging.getLogger(__name__)
+
+# Frames from files under here are the bot's own code.
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Enough frames to get from the event loop down into the cog doing the blocking.
+MAX_STACK_FRAMES = 40
+
+
+@dataclass(frozen=True, slots=True)
+class SlowCallback:
+    """A time the event loop was blocked.
+
+    Attributes
+    ----------
+    at: :class:`datetime.datetime`
+        When the loop got going again.
+    duration: float
+        How long in seconds the loop was blocked for.
+    task: Optional[str]
+        The name of the task that was running, if the watchdog caught it.
+    coroutine: Optional[str]
+        The qualified name of that task's coroutine.
+    culprit: Optional[str]
+        The innermost frame in the bot's own code, where it was blocked.
+    stack: Tuple[str, ...]
+        The formatted frames the loop was stuck in, innermost last. Empty if the watchdog didn't catch it.
+    """
+
+    at: datetime.datetime
+    duration: float
+    task: Optional[str]
+    coroutine: Optional[str]
+    culprit: Optional[str]
+    stack: Tuple[str, ...]
+
+
+class LoopMonitor:
+    """Measures the event loop's lag and records what blocked it for longer than ``threshold``.
+
+    Parameters
+    ----------
+    interval: float
+        How often in seconds the loop's lag is measured.
+    threshold: float
+        How long in seconds the loop has to be blocked for it to be recorded.
+    capacity: int
+        How many :class:`SlowCallback` are kept.
+
+    Attributes
+    ----------
+    lag: float
+        The lag in seconds from the latest measurement.
+    events: Deque[:class:`SlowCallback`]
+        The most recent stalls, oldest first.
+    """
+
+    def __init__(self, *, interval: float = 0.1, threshold: float = 0.25, capacity: int = 50) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = 0.0
+        self._peak_lag = 0.0
+        self.events: Deque[SlowCallback] = collections.deque(maxlen=capacity)
+
+        self._beat = time.monotonic()
+        # (the beat it was caught after, task, coroutine, culprit, stack), set by the watchdog thread.
+        self._caught: Optional[Tuple[float, Optional[str], Optional[str], Optional[str], Tuple[str, ...]]] = None
+        self._stopping = threading.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Starts measuring. Must be called from within the running event loop."""
+        if self._task is not None:
+            return
+
+        loop = asyncio.get_running_loop()
+        self._beat = time.monotonic()
+        self._task = loop.create_task(self._run(), name="loop-monitor")
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(loop, threading.get_ident()), name="loop-monitor-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def close(self) -> None:
+        """|coro|
+        Stops measuring.
+        """
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        while True:
+            before = self._beat
+            await asyncio.sleep(self.interval)
+            self._beat = now = time.monotonic()
+            self.lag = max(now - before - self.interval, 0.0)
+            self._peak_lag = max(self._peak_lag, self.lag)
+
+            if self.lag >= self.threshold:
+                self._record(before)
+
+    def pop_peak_lag(self) -> float:
+        """The highest lag in seconds since this was last called."""
+        peak, self._peak_lag = self._peak_lag, 0.0
+        return peak
+
+    def _record(self, beat: float, /) -> None:
+        caught, self._caught = self._caught, None
+        if caught is not None and caught[0] == beat:
+            _, task, coroutine, culprit, stack = caught
+        else:
+            # Over before the watchdog looked.
+            task, coroutine, culprit, stack = None, None, None, ()
+
+        event = SlowCallback(discord.utils.utcnow(), self.lag, task, coroutine, culprit, stack)
+        self.events.append(event)
+        _logger.warning(
+            "The event loop was blocked for %.0fms in %s (task %s)%s",
+            event.duration * 1000,
+            culprit or coroutine or "something that finished before it was caught",
+            task or "unknown",
+            "\n" + "".join(stack) if stack else "",
+        )
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int, /) -> None:
+        # Checked often enough to catch a stall while it's still going on.
+        while not self._stopping.wait(self.threshold / 2):
+            beat = self._beat
+            if time.monotonic() - beat - self.interval < self.threshold:
+                continue
+            if self._caught is not None and self._caught[0] == beat:
+                continue
+
+            frame = sys._current_frames().get(loop_thread)
+            if frame is None:
+                continue
+
+            summary = traceback.extract_stack(frame, limit=MAX_STACK_FRAMES)
+            del frame
+            culprit = next(
+                (
+                    f"{os.path.relpath(entry.filename, PROJECT_DIRECTORY)}:{entry.lineno} in {entry.name}"
+                    for entry in reversed(summary)
+                    if entry.filename.startswith(PROJECT_DIRECTORY)
+                    and "site-packages" not in entry.filename
+                    and entry.filename != __file__
+                ),
+                None,
+            )
+            task = asyncio.current_task(loop)
+            coroutine = getattr(task.get_coro(), "__qualname__", None) if task is not None else None
+            name = task.get_name() if task is not None else None
+            self._caught = (beat, name, coroutine, culprit, tuple(traceback.format_list(summary)))
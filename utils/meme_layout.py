@@ -0,0 +1,188 @@
+"""
+Fits text into the boxes of a meme template.
+
+Text is wrapped to the box's width and the largest font size that still fits the box is found with a binary search.
+Every step of the search only needs the width of each glyph at that size, so those are cached per font and size
+instead of asking FreeType to lay out the whole string again for each candidate size.
+"""
+from __future__ import annotations
+
+import functools
+from dataclasses import dataclass
+from typing import Dict, List, Literal, Optional, Tuple
+
+from utils.lazy import lazy_import
+
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageFont = lazy_import("PIL.ImageFont")
+
+HorizontalAlign = Literal["left", "center", "right"]
+VerticalAlign = Literal["top", "middle", "bottom"]
+
+_ANCHORS: Dict[HorizontalAlign, str] = {"left": "la", "center": "ma", "right": "ra"}
+
+
+@dataclass(frozen=True, slots=True)
+class TextBox:
+    x: int
+    y: int
+    width: int
+    height: int
+    align: HorizontalAlign = "center"
+    valign: VerticalAlign = "middle"
+    min_font_size: int = 16
+    max_font_size: int = 80
+    stroke_width: int = 3
+    fill: Tuple[int, int, int] = (255, 255, 255)
+    stroke_fill: Tuple[int, int, int] = (0, 0, 0)
+    uppercase: bool = True
+    line_spacing: float = 0.1
+
+
+@dataclass(frozen=True, slots=True)
+class FittedText:
+    font_size: int
+    lines: Tuple[str, ...]
+    line_height: int
+
+
+@functools.lru_cache(maxsize=64)
+def load_font(path: str, size: int, /) -> ImageFont.FreeTypeFont:
+    """Parses the font at ``path`` for ``size``, once per process."""
+    return ImageFont.truetype(font=path, size=size)
+
+
+class GlyphMetrics:
+    """The advance width of every glyph seen so far for one font at one size."""
+
+    __slots__ = ("font", "line_height", "_widths")
+
+    def __init__(self, font: ImageFont.FreeTypeFont, /) -> None:
+        self.font = font
+        ascent, descent = font.getmetrics()
+        self.line_height: int = ascent + descent
+        self._widths: Dict[str, float] = {}
+
+    def width(self, text: str, /) -> float:
+        widths = self._widths
+        total = 0.0
+        for char in text:
+            width = widths.get(char)
+            if width is None:
+                width = widths[char] = self.font.getlength(char)
+            total += width
+        return total
+
+
+@functools.lru_cache(maxsize=256)
+def glyph_metrics(path: str, size: int, /) -> GlyphMetrics:
+    return GlyphMetrics(load_font(path, size))
+
+
+def wrap_text(text: str, metrics: GlyphMetrics, max_width: float, /) -> List[str]:
+    """Greedily wraps ``text`` onto lines no wider than ``max_width``, splitting words that are too long by themselves."""
+    lines: List[str] = []
+    space = metrics.width(" ")
+
+    for paragraph in text.splitlines() or [""]:
+        line = ""
+        line_width = 0.0
+        for word in paragraph.split():
+            word_width = metrics.width(word)
+
+            if line and line_width + space + word_width <= max_width:
+                line += " " + word
+                line_width += space + word_width
+                continue
+
+            if line:
+                lines.append(line)
+            line, line_width = "", 0.0
+
+            while word_width > max_width and len(word) > 1:
+                cut = len(word) - 1
+                while cut > 1 and metrics.width(word[:cut]) > max_width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+                word_width = metrics.width(word)
+
+            line, line_width = word, word_width
+
+        lines.append(line)
+
+    return lines
+
+
+def _fits(text: str, box: TextBox, font_path: str, size: int, /) -> Optional[FittedText]:
+    metrics = glyph_metrics(font_path, size)
+    max_width = box.width - 2 * box.stroke_width
+    lines = wrap_text(text, metrics, max_width)
+
+    line_height = metrics.line_height + round(metrics.line_height * box.line_spacing)
+    height = line_height * len(lines) - round(metrics.line_height * box.line_spacing) + 2 * box.stroke_width
+
+    if height > box.height or any(metrics.width(line) > max_width for line in lines):
+        return None
+    return FittedText(size, tuple(lines), line_height)
+
+
+def fit_text(text: str, box: TextBox, font_path: str, /) -> FittedText:
+    """Finds the biggest font size between the box's min and max font size that ``text`` fits into the box at.
+
+    Text that doesn't even fit at the min font size is laid out at it anyway, overflowing the box.
+    """
+    if box.uppercase:
+        text = text.upper()
+
+    low, high = box.min_font_size, box.max_font_size
+    best: Optional[FittedText] = None
+
+    while low <= high:
+        size = (low + high) // 2
+        fitted = _fits(text, box, font_path, size)
+        if fitted is not None:
+            best = fitted
+            low = size + 1
+        else:
+            high = size - 1
+
+    if best is None:
+        metrics = glyph_metrics(font_path, box.min_font_size)
+        lines = wrap_text(text, metrics, box.width - 2 * box.stroke_width)
+        best = FittedText(box.min_font_size, tuple(lines), metrics.line_height)
+
+    return best
+
+
+def draw_text(draw: ImageDraw.ImageDraw, text: str, box: TextBox, font_path: str, /) -> None:
+    """Draws ``text`` into ``box``, sized to fit it."""
+    fitted = fit_text(text, box, font_path)
+    font = load_font(font_path, fitted.font_size)
+
+    text_height = fitted.line_height * len(fitted.lines)
+    if box.valign == "top":
+        y = box.y
+    elif box.valign == "bottom":
+        y = box.y + box.height - text_height
+    else:
+        y = box.y + (box.height - text_height) // 2
+
+    if box.align == "left":
+        x = box.x + box.stroke_width
+    elif box.align == "right":
+        x = box.x + box.width - box.stroke_width
+    else:
+        x = box.x + box.width // 2
+
+    for line in fitted.lines:
+        draw.text(
+            xy=(x, y),
+            anchor=_ANCHORS[box.align],
+            text=line,
+            font=font,
+            fill=box.fill,
+            stroke_width=box.stroke_width,
+            stroke_fill=box.stroke_fill,
+        )
+        y += fitted.line_height
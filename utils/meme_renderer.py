@@ -0,0 +1,188 @@
+"""
+Meme rendering off the event loop.
+
+Drawing text and encoding the output takes long enough to stall the gateway heartbeat, so it happens in a small
+process pool, for still images and animations alike. Each worker decodes every still template image once, when it
+starts, instead of on every render, and keeps the fonts it parses around for the next render.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence, TypeVar
+
+from utils.gif_caption import FrameBudget, FrameBudgetExceeded, caption_animation, caption_boxes
+from utils.image_encoding import EncodedImage, EncodingOptions, encode_image
+from utils.lazy import lazy_import
+from utils.meme_layout import draw_text
+from utils.meme_templates import IMPACT_FONT_PATH, MemeTemplateRegistry
+
+_logger = logging.getLogger(__name__)
+
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+
+T = TypeVar("T")
+
+# Forking a process that's running threads can leave a worker holding a copy of a lock that's never released.
+WORKER_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Loaded once per worker process by `_init_worker`.
+_registry: Optional[MemeTemplateRegistry] = None
+_images: Dict[str, Image.Image] = {}
+
+
+class RenderQueueFull(Exception):
+    """Raised when too many renders are already waiting for a worker."""
+
+
+def _init_worker() -> None:
+    global _registry
+
+    _registry = MemeTemplateRegistry.load()
+    for template in _registry:
+        # Animated templates are streamed from disk a frame at a time on every render instead.
+        if not template.animated:
+            with Image.open(template.image_path) as image:
+                _images[template.name] = image.convert("RGB")
+
+
+def render_meme(
+    template_name: str,
+    texts: Sequence[str],
+    options: EncodingOptions = EncodingOptions(),
+    budget: FrameBudget = FrameBudget(),
+) -> EncodedImage:
+    """Draws ``texts`` into the boxes of a template, in order, and returns it encoded per ``options``.
+    Animated templates are always GIFs. Runs inside a worker.
+
+    Raises
+    ------
+    `KeyError`
+        There is no template named ``template_name``.
+    `FrameBudgetExceeded`
+        An animated template went over ``budget``.
+    """
+    if _registry is None:
+        _init_worker()
+    assert _registry is not None
+
+    template = _registry.get(template_name)
+    if template is None:
+        raise KeyError(template_name)
+
+    if template.animated:
+        out = io.BytesIO()
+        caption_animation(template.image_path, texts, template.font_path, out, boxes=template.boxes, budget=budget)
+        return EncodedImage(out.getvalue(), "gif", None)
+
+    img = _images[template.name].copy()
+    draw = ImageDraw.Draw(img)
+
+    for box, text in zip(template.boxes, texts):
+        if text:
+            draw_text(draw, text, box, template.font_path)
+
+    return encode_image(img, options)
+
+
+def caption_image(
+    data: bytes, texts: Sequence[str], options: EncodingOptions = EncodingOptions(), budget: FrameBudget = FrameBudget()
+) -> EncodedImage:
+    """Captions a user's image with top and bottom text. Animated GIFs stay animated. Runs inside a worker.
+
+    Raises
+    ------
+    `FrameBudgetExceeded`
+        The image went over ``budget``.
+    `PIL.UnidentifiedImageError`
+        ``data`` isn't an image.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if getattr(image, "is_animated", False):
+            out = io.BytesIO()
+            # Pass the original bytes back in, the animation is decoded again a frame at a time.
+            caption_animation(io.BytesIO(data), texts, IMPACT_FONT_PATH, out, budget=budget)
+            return EncodedImage(out.getvalue(), "gif", None)
+
+        width, height = image.size
+        if width * height > budget.max_pixels:
+            raise FrameBudgetExceeded(f"The image is {width}x{height}, over the {budget.max_pixels:,} pixel limit")
+
+        img = image.convert("RGB")
+
+    draw = ImageDraw.Draw(img)
+    for box, text in zip(caption_boxes(img.size), texts):
+        if text:
+            draw_text(draw, text, box, IMPACT_FONT_PATH)
+
+    return encode_image(img, options)
+
+
+class RenderPool:
+    """A bounded process pool for rendering images.
+
+    Parameters
+    ----------
+    max_workers: int
+        The amount of worker processes.
+    max_queued: int
+        The most renders allowed to wait for a free worker. Past that, :meth:`render` raises
+        :class:`RenderQueueFull` instead of letting the backlog grow.
+    """
+
+    def __init__(self, *, max_workers: int = 2, max_queued: int = 8) -> None:
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=WORKER_CONTEXT, initializer=_init_worker)
+        self._in_flight = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """:class:`int`: The amount of renders waiting for a worker."""
+        return max(self._in_flight - self.max_workers, 0)
+
+    @property
+    def full(self) -> bool:
+        """:class:`bool`: Whether :meth:`render` would raise :class:`RenderQueueFull` right now."""
+        return self._in_flight >= self.max_workers + self.max_queued
+
+    async def render(self, func: Callable[..., T], *args: Any) -> T:
+        """|coro|
+        Runs ``func(*args)`` in a worker process and returns its result.
+
+        ``func`` must be a module level function so it can be pickled.
+
+        Raises
+        ------
+        `RenderQueueFull`
+            Too many renders are already waiting.
+        """
+        if self.full:
+            raise RenderQueueFull(f"{self.queue_depth} renders are already waiting")
+
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(func, *args)
+        self._in_flight += 1
+        # A worker keeps rendering after whoever awaited it gives up, its slot is only free once it's done.
+        future.add_done_callback(lambda _: self._release(loop))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _release(self, loop: asyncio.AbstractEventLoop, /) -> None:
+        # Called from the executor's thread.
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:
+            # The loop's closed, nothing's counting any more.
+            pass
+
+    def _decrement(self) -> None:
+        self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,123 @@
+"""
+The meme templates the bot can render.
+
+Each template is a JSON descriptor in ``assets/memes`` naming its image, font and the boxes its text goes in:
+
+.. code-block:: json
+
+    {
+        "name": "spongebob-scream",
+        "display_name": "Spongebob Screaming",
+        "image": "spgbob_screaming.jpg",
+        "font": "impact.ttf",
+        "boxes": [{"x": 20, "y": 10, "width": 1120, "height": 120}]
+    }
+
+``image`` and ``font`` are relative to ``assets``, and a ``.gif`` image makes an animated template.
+Boxes take any of the fields of :class:`utils.meme_layout.TextBox`.
+
+Each template's :attr:`MemeTemplate.version` changes whenever its descriptor, image or font does, and goes into
+the key its renders are cached under, so an edited template doesn't keep serving renders of the old one.
+"""
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from utils.meme_layout import TextBox
+
+ASSETS_DIRECTORY = pathlib.Path("assets")
+TEMPLATES_DIRECTORY = ASSETS_DIRECTORY / "memes"
+IMPACT_FONT_PATH = str(ASSETS_DIRECTORY / "impact.ttf")
+
+
+@dataclass(frozen=True, slots=True)
+class MemeTemplate:
+    name: str
+    display_name: str
+    image_path: str
+    font_path: str
+    boxes: Tuple[TextBox, ...]
+    max_chars: int = 120
+    version: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], /) -> MemeTemplate:
+        boxes = []
+        for box in data["boxes"]:
+            for color in ("fill", "stroke_fill"):
+                if color in box:
+                    box = {**box, color: tuple(box[color])}
+            boxes.append(TextBox(**box))
+
+        return cls(
+            name=data["name"],
+            display_name=data.get("display_name", data["name"]),
+            image_path=str(ASSETS_DIRECTORY / data["image"]),
+            font_path=str(ASSETS_DIRECTORY / data["font"]) if "font" in data else IMPACT_FONT_PATH,
+            boxes=tuple(boxes),
+            max_chars=data.get("max_chars", cls.max_chars),
+        )
+
+    @property
+    def animated(self) -> bool:
+        """:class:`bool`: Whether the template is an animated GIF, which is captioned frame by frame."""
+        return self.image_path.lower().endswith(".gif")
+
+
+def template_version(descriptor: bytes, template: MemeTemplate, /) -> str:
+    """A digest of the template's JSON ``descriptor`` and when its image and font files were last changed."""
+    digest = hashlib.sha256(descriptor)
+    for path in (template.image_path, template.font_path):
+        stat = os.stat(path)
+        digest.update(f"\0{path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()[:16]
+
+
+class MemeTemplateRegistry:
+    """Every template in a directory, plus an index for searching them by name.
+
+    Parameters
+    ----------
+    templates: List[:class:`MemeTemplate`]
+        The templates to hold.
+    """
+
+    def __init__(self, templates: List[MemeTemplate]) -> None:
+        self._templates: Dict[str, MemeTemplate] = {template.name: template for template in templates}
+
+        # (lowercase search key, template) sorted by key, built once so autocomplete is only a scan over short strings.
+        self._index: List[Tuple[str, MemeTemplate]] = sorted(
+            ((f"{template.name} {template.display_name}".lower(), template) for template in templates),
+            key=lambda entry: entry[0],
+        )
+
+    @classmethod
+    def load(cls, directory: pathlib.Path = TEMPLATES_DIRECTORY, /) -> MemeTemplateRegistry:
+        templates = []
+        for path in sorted(directory.glob("*.json")):
+            descriptor = path.read_bytes()
+            template = MemeTemplate.from_dict(json.loads(descriptor))
+            templates.append(dataclasses.replace(template, version=template_version(descriptor, template)))
+        return cls(templates)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __iter__(self):
+        return iter(self._templates.values())
+
+    def get(self, name: str, /) -> MemeTemplate | None:
+        return self._templates.get(name)
+
+    def search(self, query: str, /, *, limit: int = 25) -> List[MemeTemplate]:
+        """Templates matching ``query``, names starting with it first. An empty query matches everything."""
+        query = query.strip().lower()
+        prefixed = [template for key, template in self._index if key.startswith(query)]
+        contained = [template for key, template in self._index if query in key and not key.startswith(query)]
+        return (prefixed + contained)[:limit]
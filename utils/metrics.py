@@ -0,0 +1,234 @@
+"""
+Latency, error and in-flight metrics for every command.
+
+:class:`CommandMetrics` keeps a histogram of how long each command took, how often it failed and how many are
+running right now, keyed by the kind of command (``prefix`` or ``app``) and its qualified name. Prefix commands are
+timed from the ``command`` event until ``command_completion`` or ``command_error``, and app commands from
+:meth:`InstrumentedTree.interaction_check` until ``app_command_completion`` or :meth:`InstrumentedTree.on_error`.
+
+The numbers can be read with ``aml metrics``, or scraped in the Prometheus text format from :class:`MetricsServer`
+when ``METRICS_PORT`` is set.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from utils.lazy import lazy_import
+
+if TYPE_CHECKING:
+    from aiohttp import web
+else:
+    # Only needed when the endpoint is turned on.
+    web = lazy_import("aiohttp.web")
+
+_logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a snappy reply to an upscale that took its time.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "millenia"
+
+# Where an app command's interaction keeps the name and start time it's counted under until it's done.
+_STARTED = "metrics_started"
+
+
+@dataclass(slots=True)
+class LatencyHistogram:
+    """Counts of durations in seconds per bucket of ``bounds``, the last count being everything above them."""
+
+    bounds: Tuple[float, ...] = LATENCY_BUCKETS
+    counts: List[int] = field(default_factory=list)
+    count: int = 0
+    sum: float = 0.0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, duration: float, /) -> None:
+        self.counts[bisect.bisect_left(self.bounds, duration)] += 1
+        self.count += 1
+        self.sum += duration
+
+    def quantile(self, q: float, /) -> float:
+        """Estimates the ``q`` quantile, interpolating within the bucket it falls in like Prometheus does.
+        Anything past the last bucket is reported as the last bucket's bound.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+@dataclass(slots=True)
+class CommandStats:
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    errors: int = 0
+    in_flight: int = 0
+
+
+class CommandMetrics:
+    """Every command's :class:`CommandStats`, keyed by ``(kind, qualified_name)``."""
+
+    def __init__(self) -> None:
+        self.commands: Dict[Tuple[str, str], CommandStats] = {}
+
+    def stats(self, kind: str, name: str, /) -> CommandStats:
+        stats = self.commands.get((kind, name))
+        if stats is None:
+            stats = self.commands[(kind, name)] = CommandStats()
+        return stats
+
+    def started(self, kind: str, name: str, /) -> None:
+        """Counts a run of ``name`` as in flight until :meth:`finished` is called for it."""
+        self.stats(kind, name).in_flight += 1
+
+    def finished(self, kind: str, started_as: str, name: str, duration: float, /, *, failed: bool) -> None:
+        """Records a run that :meth:`started` as ``started_as`` and took ``duration`` seconds. It's recorded under
+        ``name``, which only differs when a group turned out to be running one of its subcommands.
+        """
+        self.stats(kind, started_as).in_flight -= 1
+        stats = self.stats(kind, name)
+        stats.latency.observe(duration)
+        if failed:
+            stats.errors += 1
+
+    def render_prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        duration = f"{METRIC_PREFIX}_command_duration_seconds"
+        errors = f"{METRIC_PREFIX}_command_errors_total"
+        in_flight = f"{METRIC_PREFIX}_commands_in_flight"
+        items = sorted(self.commands.items())
+
+        lines = [
+            f"# HELP {duration} How long commands took to run.",
+            f"# TYPE {duration} histogram",
+        ]
+        for (kind, name), stats in items:
+            labels = f'kind="{_escape(kind)}",command="{_escape(name)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(stats.latency.bounds + (float("inf"),), stats.latency.counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{duration}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{duration}_sum{{{labels}}} {stats.latency.sum}")
+            lines.append(f"{duration}_count{{{labels}}} {stats.latency.count}")
+
+        lines += [f"# HELP {errors} Commands that failed.", f"# TYPE {errors} counter"]
+        for (kind, name), stats in items:
+            lines.append(f'{errors}{{kind="{_escape(kind)}",command="{_escape(name)}"}} {stats.errors}')
+
+        lines += [f"# HELP {in_flight} Commands running right now.", f"# TYPE {in_flight} gauge"]
+        for (kind, name), stats in items:
+            lines.append(f'{in_flight}{{kind="{_escape(kind)}",command="{_escape(name)}"}} {stats.in_flight}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def invoked_name(ctx: commands.Context, /) -> str:
+    """The qualified name of the command ``ctx`` runs.
+
+    ``ctx.command`` is only the top level command until a group hands over to its subcommand, so the subcommand names
+    are followed through the message the way :meth:`commands.Group.invoke` does. A group that takes arguments of its own
+    is as far as it goes, they come before the subcommand's name.
+    """
+    command = ctx.command
+    view = StringView(ctx.message.content)
+    view.skip_string(ctx.prefix or "")
+    view.get_word()
+    while isinstance(command, commands.Group) and not command.clean_params:
+        view.skip_ws()
+        subcommand = command.all_commands.get(view.get_word())
+        if subcommand is None:
+            break
+        command = subcommand
+    return command.qualified_name
+
+
+def finish_app_command(interaction: discord.Interaction, /, *, failed: bool) -> None:
+    """Records the app command ``interaction`` ran, if :class:`InstrumentedTree` started timing it."""
+    started = interaction.extras.pop(_STARTED, None)
+    if started is not None:
+        name, start = started
+        metrics: CommandMetrics = interaction.client.metrics  # type: ignore
+        metrics.finished("app", name, name, time.perf_counter() - start, failed=failed)
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """A command tree that starts timing every app command it runs, for the client's ``metrics``."""
+
+    async def interaction_check(self, interaction: discord.Interaction, /) -> bool:
+        # Autocomplete is checked too, only time the commands themselves.
+        command = interaction.command
+        if interaction.type is discord.InteractionType.application_command and command is not None:
+            interaction.extras[_STARTED] = (command.qualified_name, time.perf_counter())
+            self.client.metrics.started("app", command.qualified_name)  # type: ignore
+        return await super().interaction_check(interaction)
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError, /) -> None:
+        finish_app_command(interaction, failed=True)
+        await super().on_error(interaction, error)
+
+
+class MetricsServer:
+    """Serves :meth:`CommandMetrics.render_prometheus` at ``/metrics`` on ``host`` and ``port``.
+
+    Parameters
+    ----------
+    metrics: :class:`CommandMetrics`
+        The metrics to serve.
+    host: str
+        The address to listen on, only this machine by default.
+    port: int
+        The port to listen on.
+    """
+
+    def __init__(self, metrics: CommandMetrics, *, host: str = "127.0.0.1", port: int) -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _serve_metrics(self, _: web.Request) -> web.Response:
+        return web.Response(text=self.metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        """|coro|
+        Starts listening.
+        """
+        app = web.Application()
+        app.router.add_get("/metrics", self._serve_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        _logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    async def close(self) -> None:
+        """|coro|
+        Stops listening.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,120 @@
+"""
+Numbered SQL migrations for the bot's database.
+
+Every file in the ``migrations`` folder named ``NNNN_description.sql`` is a migration. They are applied in order,
+and each one that succeeds is recorded in the ``schema_version`` table along with a checksum of its contents,
+so startup only runs the ones that haven't been applied yet.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import pathlib
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List
+
+import discord
+
+if TYPE_CHECKING:
+    import asqlite
+
+_logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIRECTORY = pathlib.Path("migrations")
+MIGRATION_FILENAME_RE = re.compile(r"^(?P<version>\d+)_(?P<name>[\w-]+)\.sql$")
+
+SCHEMA_VERSION_TABLE = """
+CREATE TABLE if not EXISTS schema_version(
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TEXT NOT NULL
+);
+"""
+
+
+class MigrationError(Exception):
+    """Raised when the migrations on disk don't agree with the ones recorded in the database."""
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @classmethod
+    def from_path(cls, path: pathlib.Path, /) -> Migration:
+        match = MIGRATION_FILENAME_RE.match(path.name)
+        if match is None:
+            raise MigrationError(f"Migration file {path.name!r} isn't named like NNNN_description.sql")
+
+        return cls(int(match["version"]), match["name"], path.read_text(encoding="utf-8"))
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def load_migrations(directory: pathlib.Path = MIGRATIONS_DIRECTORY, /) -> List[Migration]:
+    """Reads every migration in ``directory``, sorted by version.
+
+    Raises
+    ------
+    `MigrationError`
+        Two files share the same version number.
+    """
+    migrations = sorted((Migration.from_path(path) for path in directory.glob("*.sql")), key=lambda m: m.version)
+
+    for previous, current in zip(migrations, migrations[1:]):
+        if previous.version == current.version:
+            raise MigrationError(f"Migrations {previous.name!r} and {current.name!r} share version {current.version}")
+
+    return migrations
+
+
+async def apply_migrations(pool: asqlite.Pool, directory: pathlib.Path = MIGRATIONS_DIRECTORY, /) -> List[Migration]:
+    """Applies every migration in ``directory`` that isn't recorded in ``schema_version`` yet.
+
+    Returns
+    -------
+    `List[Migration]`
+        The migrations that were applied during this call.
+
+    Raises
+    ------
+    `MigrationError`
+        An already applied migration was edited after the fact.
+    """
+    migrations = load_migrations(directory)
+
+    async with pool.acquire() as conn:
+        await conn.executescript(SCHEMA_VERSION_TABLE)
+        rows = await conn.fetchall("SELECT version, name, checksum FROM schema_version")
+        applied = {row["version"]: row for row in rows}
+
+        pending: List[Migration] = []
+        for migration in migrations:
+            row = applied.get(migration.version)
+            if row is None:
+                pending.append(migration)
+            elif row["checksum"] != migration.checksum:
+                raise MigrationError(
+                    f"Migration {migration.version:04d}_{migration.name} was changed after being applied, "
+                    "add a new migration instead of editing it"
+                )
+
+        for migration in pending:
+            _logger.info("Applying migration %04d_%s", migration.version, migration.name)
+            await conn.executescript(migration.sql)
+            await conn.execute(
+                "INSERT INTO schema_version(version, name, checksum, applied_at) VALUES (?, ?, ?, ?)",
+                migration.version,
+                migration.name,
+                migration.checksum,
+                discord.utils.utcnow().isoformat(),
+            )
+            await conn.commit()
+
+    return pending
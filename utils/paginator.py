@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import abc
-from typing import Generic, List, Optional, Union
+import asyncio
+import sqlite3
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generic, List, Optional, Sequence, Union
 
 import discord
 from discord.ext import commands
@@ -9,6 +12,9 @@ from typing_extensions import Self, TypeAlias, TypeVar
 
 from utils.embed import create_embed_failure
 
+if TYPE_CHECKING:
+    import asqlite
+
 T = TypeVar("T")
 BotT = TypeVar("BotT", bound="commands.Bot", default="commands.Bot")
 TargetType: TypeAlias = Union["discord.Interaction[BotT]", "commands.Context[BotT]"]
@@ -207,3 +213,255 @@ class BaseButtonPaginator(Generic[T, BotT], discord.ui.View, abc.ABC):
         self.stop()
 
         return await interaction.edit_original_response(view=self)
+
+
+@dataclass(slots=True)
+class KeysetPage(Generic[T]):
+    first_id: int
+    last_id: int
+    entries: List[T]
+
+
+class KeysetPageSource(Generic[T]):
+    """Fetches pages of a table ordered by ``id`` using keyset pagination, so a page
+    costs the same to fetch no matter how deep into the results it is.
+
+    Parameters
+    ----------
+    pool: :class:`asqlite.Pool`
+        The pool to run the queries on.
+    table: str
+        The table to page through. This is put into the query as is, never pass user input.
+    converter: Callable[[:class:`sqlite3.Row`], Any]
+        Turns a row into an entry, e.g. ``TodoItem.from_row``.
+    where: str
+        An optional filter, e.g. ``"owner_id = ? AND guild_id = ?"``. This is put into the query as is,
+        pass any values through ``args``.
+    args: Sequence[Any]
+        The values bound to the placeholders in ``where``.
+    """
+
+    def __init__(
+        self,
+        pool: asqlite.Pool,
+        table: str,
+        converter: Callable[[sqlite3.Row], T],
+        *,
+        where: str = "",
+        args: Sequence[Any] = (),
+    ) -> None:
+        self.pool = pool
+        self.table = table
+        self.converter = converter
+        self.where = where
+        self.args = tuple(args)
+
+    def _filter(self, keyset: Optional[str] = None) -> str:
+        clauses = [clause for clause in (self.where, keyset) if clause]
+        return f"WHERE {' AND '.join(f'({clause})' for clause in clauses)}" if clauses else ""
+
+    async def count(self) -> int:
+        """|coro|
+        The amount of rows matching the filter.
+        """
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchone(f"SELECT COUNT(*) AS total FROM {self.table} {self._filter()}", *self.args)
+
+        return row["total"] if row else 0
+
+    async def fetch(
+        self, limit: int, *, after: Optional[int] = None, before: Optional[int] = None, from_end: bool = False
+    ) -> Optional[KeysetPage[T]]:
+        """|coro|
+        Fetches up to ``limit`` entries in ascending ``id`` order.
+
+        Parameters
+        ----------
+        limit: int
+            The max amount of entries to fetch.
+        after: Optional[int]
+            Only fetch entries with an id greater than this.
+        before: Optional[int]
+            Only fetch the entries closest to, and with an id less than, this.
+        from_end: bool
+            Fetch the last ``limit`` entries instead of the first ones. Implied by ``before``.
+
+        Returns
+        -------
+        Optional[:class:`KeysetPage`]
+            The page, or ``None`` if there is nothing to fetch.
+        """
+        args = list(self.args)
+        keyset = None
+        if after is not None:
+            keyset = "id > ?"
+            args.append(after)
+        elif before is not None:
+            keyset = "id < ?"
+            args.append(before)
+
+        descending = before is not None or (from_end and after is None)
+        query = f"SELECT * FROM {self.table} {self._filter(keyset)} ORDER BY id {'DESC' if descending else 'ASC'} LIMIT ?"
+
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetchall(query, *args, limit)
+
+        if not rows:
+            return None
+
+        if descending:
+            rows = rows[::-1]
+
+        return KeysetPage(rows[0]["id"], rows[-1]["id"], [self.converter(row) for row in rows])
+
+
+class BaseKeysetPaginator(BaseButtonPaginator[T, BotT]):
+    """A button paginator that fetches its pages from the database as they're needed
+    instead of holding every entry in memory. This class should be inherited then the
+    custom instance defined, the same as :class:`BaseButtonPaginator`.
+
+    Only the current page and up to ``prefetch`` pages on either side of it are kept,
+    so the memory used by a view doesn't grow with the amount of entries.
+
+    Use :meth:`create` to make an instance, it fetches the entry count and first page.
+
+    Parameters
+    ----------
+    source: :class:`KeysetPageSource`
+        Where to fetch the pages from.
+    total_entries: int
+        The amount of entries in ``source``.
+    prefetch: int
+        The amount of neighbouring pages to fetch ahead of time on either side of the current page.
+    """
+
+    def __init__(
+        self,
+        *,
+        source: KeysetPageSource[T],
+        total_entries: int,
+        per_page: int = 6,
+        clamp_pages: bool = True,
+        prefetch: int = 1,
+        target: Optional[TargetType[BotT]] = None,
+    ) -> None:
+        super().__init__(entries=[], per_page=per_page, clamp_pages=clamp_pages, target=target)
+        self.source: KeysetPageSource[T] = source
+        self.total_entries: int = total_entries
+        self.prefetch: int = prefetch
+
+        self._page_cache: Dict[int, KeysetPage[T]] = {}
+        self._fetch_lock = asyncio.Lock()
+        self._prefetch_task: Optional[asyncio.Task[None]] = None
+
+    @classmethod
+    async def create(cls, source: KeysetPageSource[T], **kwargs: Any) -> Self:
+        """|coro|
+        Makes a paginator for ``source``, fetching the entry count up front.
+        Check :attr:`total_entries` before sending it, there may be nothing to show.
+        """
+        return cls(source=source, total_entries=await source.count(), **kwargs)
+
+    @property
+    def max_page(self) -> int:
+        """:class:`int`: The max page count for this paginator."""
+        return max(-(-self.total_entries // self.per_page), 1)
+
+    @property
+    def total_pages(self) -> int:
+        """:class:`int`: Returns the total amount of pages."""
+        return self.max_page
+
+    def format_empty(self) -> discord.Embed:
+        """Used when every entry was removed while the paginator was open. This can be overwritten by the subclass."""
+        return create_embed_failure("There is nothing left to show.")
+
+    def _window(self, index: int, /) -> List[int]:
+        indexes = []
+        for offset in range(-self.prefetch, self.prefetch + 1):
+            neighbour = index + offset
+            if self.clamp_pages:
+                neighbour %= self.max_page
+            if 0 <= neighbour < self.max_page and neighbour not in indexes:
+                indexes.append(neighbour)
+        return indexes
+
+    async def _fetch_page(self, index: int, /) -> Optional[KeysetPage[T]]:
+        previous = self._page_cache.get(index - 1)
+        following = self._page_cache.get(index + 1)
+
+        if index == 0:
+            return await self.source.fetch(self.per_page)
+        if previous is not None:
+            return await self.source.fetch(self.per_page, after=previous.last_id)
+        if index == self.max_page - 1:
+            # Rows added since the count was taken would move where the last page starts, so count them again.
+            self.total_entries = await self.source.count()
+            if index == self.max_page - 1:
+                return await self.source.fetch(self.total_entries - index * self.per_page, from_end=True)
+        if following is not None:
+            return await self.source.fetch(self.per_page, before=following.first_id)
+
+        # Not next to any page we know the ids of, walk forward from the closest one we do.
+        known = max((i for i in self._page_cache if i < index), default=None)
+        page = self._page_cache[known] if known is not None else await self.source.fetch(self.per_page)
+        for _ in range(index - (known if known is not None else 0)):
+            if page is None:
+                break
+            page = await self.source.fetch(self.per_page, after=page.last_id)
+        return page
+
+    async def _load_page(self, index: int, /) -> Optional[KeysetPage[T]]:
+        async with self._fetch_lock:
+            page = self._page_cache.get(index)
+            if page is None:
+                page = await self._fetch_page(index)
+                # The user may have moved on while it was fetched, don't bring back a page that was evicted.
+                if page is not None and index in self._window(self._current_page_index):
+                    self._page_cache[index] = page
+            return page
+
+    async def _prefetch(self, index: int, /) -> None:
+        for neighbour in self._window(index):
+            if neighbour not in self._page_cache:
+                await self._load_page(neighbour)
+
+    def _evict_outside_window(self, index: int, /) -> None:
+        window = self._window(index)
+        for cached in list(self._page_cache):
+            if cached not in window:
+                del self._page_cache[cached]
+
+    async def embed(self) -> discord.Embed:
+        """|coro|
+        A helper function to get the embed for the current page, fetching it if it isn't cached.
+        Returns
+        -------
+        :class:`discord.Embed`
+            The embed for the current page.
+        """
+        index = self._current_page_index
+        page = await self._load_page(index)
+
+        if page is None:
+            # Entries were removed since the paginator was made, start over from the first page.
+            self._page_cache.clear()
+            self.total_entries = await self.source.count()
+            self._current_page_index = index = 0
+            page = await self._load_page(index)
+
+        if page is None:
+            return self.format_empty()
+
+        self._evict_outside_window(index)
+        # Prefetching around the page the user left is wasted, start over around this one.
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+        self._prefetch_task = asyncio.create_task(self._prefetch(index))
+
+        return await discord.utils.maybe_coroutine(self.format_page, page.entries)
+
+    async def on_timeout(self) -> None:
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+        self._page_cache.clear()
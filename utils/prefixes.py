@@ -0,0 +1,105 @@
+"""
+Per-server command prefixes, resolved from memory.
+
+Every message the bot can see goes through ``get_prefix``, so the prefixes in the ``guild_config`` table are all read
+into a dict when the bot starts and only written through :meth:`PrefixCache.set`, which keeps the two in step.
+"""
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import asqlite
+
+_logger = logging.getLogger(__name__)
+
+MAX_PREFIX_LENGTH = 16
+
+
+class InvalidPrefix(Exception):
+    """Raised when a prefix can't be used."""
+
+
+def validate_prefix(prefix: str, /) -> str:
+    """Returns ``prefix`` if it can be used as a command prefix.
+
+    Raises
+    ------
+    `InvalidPrefix`
+        ``prefix`` is empty, too long, starts with whitespace or spans lines.
+    """
+    if not prefix.strip():
+        raise InvalidPrefix("The prefix can't be empty")
+    if len(prefix) > MAX_PREFIX_LENGTH:
+        raise InvalidPrefix(f"The prefix can be at most {MAX_PREFIX_LENGTH} characters long")
+    # Discord trims messages, so a prefix starting with whitespace could never be typed.
+    if prefix[0].isspace() or "\n" in prefix:
+        raise InvalidPrefix("The prefix can't start with a space or span more than one line")
+    return prefix
+
+
+class PrefixCache:
+    """Every server's prefix, falling back to ``default``.
+
+    Parameters
+    ----------
+    pool: :class:`asqlite.Pool`
+        The pool holding the ``guild_config`` table.
+    default: str
+        The prefix in DMs and servers that haven't set their own.
+    """
+
+    def __init__(self, pool: asqlite.Pool, default: str) -> None:
+        self.pool = pool
+        self.default = default
+        self._prefixes: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+    async def load(self) -> None:
+        """|coro|
+        Reads every server's prefix, replacing what's cached.
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetchall("SELECT guild_id, prefix FROM guild_config WHERE prefix IS NOT NULL")
+
+        self._prefixes = {row["guild_id"]: row["prefix"] for row in rows}
+        _logger.info("Loaded %d custom prefixes", len(self._prefixes))
+
+    def get(self, guild_id: Optional[int], /) -> str:
+        """The prefix for the server with ``guild_id``, or the default one for ``None``."""
+        return self._prefixes.get(guild_id, self.default)  # type: ignore
+
+    def could_be_command(self, guild_id: Optional[int], content: str, /) -> bool:
+        """Whether ``content`` starts with the first character of its server's prefix.
+        Most messages don't, and can be turned away before any work goes into parsing them.
+        """
+        return content[:1] == self.get(guild_id)[0]
+
+    async def set(self, guild_id: int, prefix: Optional[str], /) -> None:
+        """|coro|
+        Sets the prefix for the server with ``guild_id``, ``None`` goes back to the default.
+
+        Raises
+        ------
+        `InvalidPrefix`
+            See :func:`validate_prefix`.
+        """
+        if prefix is not None:
+            validate_prefix(prefix)
+
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """INSERT INTO guild_config(guild_id, prefix) VALUES (?, ?)
+                ON CONFLICT(guild_id) DO UPDATE SET prefix = excluded.prefix""",
+                guild_id,
+                prefix,
+            )
+
+        # Only once it's written, so the cache never holds a prefix the database doesn't.
+        if prefix is None:
+            self._prefixes.pop(guild_id, None)
+        else:
+            self._prefixes[guild_id] = prefix
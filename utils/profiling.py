@@ -0,0 +1,137 @@
+"""
+Profiling the running bot without restarting it.
+
+:func:`sample_stacks` is a sampling CPU profiler: every ``interval`` it records where each thread is, so what it costs
+is set by the sampling rate rather than by how busy the bot is, unlike cProfile which traces every call. The result is
+in the collapsed stack format flame graph tools (``flamegraph.pl``, speedscope) read.
+
+:func:`allocation_diff` traces memory allocations with :mod:`tracemalloc` for a while and compares what was allocated
+at the end with the start. Tracing slows every allocation down, so it's only on for that window.
+"""
+from __future__ import annotations
+
+import collections
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Counter, List, NamedTuple, Tuple
+
+STDLIB_DIRECTORY = os.path.dirname(os.__file__)
+
+# Deeper stacks are cut off at their outermost frames.
+MAX_STACK_DEPTH = 64
+
+
+class StackProfile(NamedTuple):
+    stacks: Counter[str]
+    samples: int
+    duration: float
+
+    def collapsed(self) -> str:
+        """One ``frame;frame;frame count`` line per distinct stack, outermost frame first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hottest(self, limit: int = 10, /) -> List[Tuple[str, float]]:
+        """The ``limit`` frames that were innermost most often, with the share of samples they were in."""
+        own: Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        return [(frame, count / max(self.samples, 1)) for frame, count in own.most_common(limit)]
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}"
+
+
+def sample_stacks(duration: float, /, *, interval: float = 0.01) -> StackProfile:
+    """Samples every thread's stack every ``interval`` seconds for ``duration`` seconds. Blocks, run it in a thread.
+
+    Idle threads are sampled too, showing up in whatever they're waiting on, like the event loop's selector.
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks: Counter[str] = collections.Counter()
+    samples = 0
+
+    start = time.perf_counter()
+    deadline = start + duration
+    while (now := time.perf_counter()) < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+
+            labels = []
+            while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(labels))] += 1
+
+        # Holding on to a frame keeps everything it references alive.
+        frame = None
+        samples += 1
+        # Sleeping releases the GIL, the bot keeps running in between samples.
+        time.sleep(max(interval - (time.perf_counter() - now), 0))
+
+    return StackProfile(stacks, samples, time.perf_counter() - start)
+
+
+def _short_path(filename: str, /) -> str:
+    # Installed packages and the standard library from their package down, the bot's own files from the project root.
+    _, found, inside = filename.rpartition(f"site-packages{os.sep}")
+    if found:
+        return inside
+    for root in (STDLIB_DIRECTORY, os.getcwd()):
+        if filename.startswith(root):
+            return os.path.relpath(filename, root)
+    return filename
+
+
+class AllocationSite(NamedTuple):
+    location: str
+    size_diff: int
+    count_diff: int
+    line: str
+
+
+def allocation_diff(duration: float, /, *, limit: int = 15, frames: int = 1) -> List[AllocationSite]:
+    """Traces allocations for ``duration`` seconds and returns the ``limit`` sites whose allocations changed the most.
+    Blocks, run it in a thread. Tracing is left on if something else had already started it.
+    """
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(frames)
+
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(duration)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not already_tracing:
+            tracemalloc.stop()
+
+    # The snapshots themselves and whatever importing did along the way aren't interesting.
+    ignored = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+    stats = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "lineno")
+
+    sites = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        sites.append(
+            AllocationSite(
+                f"{_short_path(frame.filename)}:{frame.lineno}",
+                stat.size_diff,
+                stat.count_diff,
+                linecache.getline(frame.filename, frame.lineno).strip(),
+            )
+        )
+    return sites
@@ -0,0 +1,154 @@
+"""
+A content-addressed cache of rendered images.
+
+Outputs are keyed by a hash of what went into them, so a repeated request is served from the cached bytes
+without touching Pillow. Recently used outputs are kept in memory, and everything is also written to disk,
+which is trimmed back down by least recent use once it grows past its size limit.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pathlib
+from typing import Any, Optional, Sequence
+
+from utils.cache import CacheStats, SizedTTLCache
+
+_logger = logging.getLogger(__name__)
+
+RENDER_CACHE_DIRECTORY = pathlib.Path("cache/renders")
+
+
+def render_cache_key(*parts: Any) -> str:
+    """Hashes JSON serializable ``parts`` into a cache key."""
+    payload = json.dumps(parts, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def meme_cache_key(template_name: str, template_version: str, texts: Sequence[str], output_format: str, /) -> str:
+    return render_cache_key("meme", template_name, template_version, list(texts), output_format)
+
+
+def normalize_text(text: str, *, uppercase: bool = False) -> str:
+    """Collapses runs of spaces in ``text``, which never change how it renders."""
+    text = "\n".join(" ".join(line.split()) for line in text.strip().splitlines())
+    return text.upper() if uppercase else text
+
+
+class RenderCache:
+    """A two tier, memory then disk, cache of rendered images.
+
+    Parameters
+    ----------
+    directory: :class:`pathlib.Path`
+        Where the disk tier keeps its files.
+    max_memory_bytes: int
+        The most bytes held in memory.
+    max_disk_bytes: int
+        The most bytes kept on disk. Past that, the least recently used files are deleted until
+        the disk tier is back under 90% of it.
+    """
+
+    def __init__(
+        self,
+        directory: pathlib.Path = RENDER_CACHE_DIRECTORY,
+        *,
+        max_memory_bytes: int = 16 * 1024 * 1024,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: SizedTTLCache[str, bytes] = SizedTTLCache(max_bytes=max_memory_bytes, ttl=24 * 60 * 60, sizeof=len)
+
+        self.disk_hits = 0
+        self._disk_size: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        """:class:`CacheStats`: The memory tier's counters. Disk hits are counted as memory misses."""
+        return self.memory.stats
+
+    def _path(self, key: str, /) -> pathlib.Path:
+        return self.directory / key[:2] / key
+
+    def _read(self, key: str, /) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        # Bump the modification time, the disk tier evicts by it.
+        os.utime(path)
+        return data
+
+    def _write(self, key: str, data: bytes, /) -> int:
+        """Writes ``data`` to disk and returns how much it grew the disk tier by."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+
+        temporary = path.with_suffix(".tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+        return len(data) - replaced
+
+    def _scan(self) -> int:
+        return sum(path.stat().st_size for path in self.directory.glob("*/*") if path.is_file())
+
+    def _evict(self) -> int:
+        """Deletes the least recently used files until the disk tier is under 90% of its limit. Returns its new size."""
+        files = sorted(
+            ((path.stat(), path) for path in self.directory.glob("*/*") if path.is_file()),
+            key=lambda entry: entry[0].st_mtime,
+        )
+        size = sum(stat.st_size for stat, _ in files)
+        target = self.max_disk_bytes * 0.9
+
+        for stat, path in files:
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+
+        return size
+
+    async def get(self, key: str, /) -> Optional[bytes]:
+        """|coro|
+        Returns the cached bytes for ``key``, or ``None`` if they aren't cached.
+        """
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+
+        data = await asyncio.to_thread(self._read, key)
+        if data is not None:
+            self.disk_hits += 1
+            self.memory.set(key, data)
+        return data
+
+    async def put(self, key: str, data: bytes, /) -> None:
+        """|coro|
+        Caches ``data`` under ``key`` in both tiers.
+        """
+        self.memory.set(key, data)
+
+        async with self._lock:
+            try:
+                if self._disk_size is None:
+                    self._disk_size = await asyncio.to_thread(self._scan)
+
+                self._disk_size += await asyncio.to_thread(self._write, key, data)
+                if self._disk_size > self.max_disk_bytes:
+                    self._disk_size = await asyncio.to_thread(self._evict)
+            except OSError:
+                _logger.exception("Failed to write render %s to the disk cache", key)
+                self._disk_size = None
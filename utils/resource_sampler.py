@@ -0,0 +1,178 @@
+"""
+Samples the bot's resource usage in the background.
+
+:class:`ResourceSampler` takes a :class:`ResourceSample` every ``interval`` seconds and keeps the most recent ones in a
+ring buffer, which ``aml appinfo`` reads its numbers from and ``aml stats`` charts. It also keeps the application's
+info from Discord for a while, so neither has to ask for it over REST every time.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Deque, Optional, Tuple
+
+from utils.lazy import lazy_import
+
+try:
+    psutil = lazy_import("psutil")
+except ImportError:
+    psutil = None
+
+if TYPE_CHECKING:
+    import discord
+
+    from millenia import Millenia
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ResourceSample:
+    """The bot's resource usage at one point in time. The process and system fields are ``None`` without psutil.
+
+    Attributes
+    ----------
+    at: float
+        When it was taken, as a UNIX timestamp.
+    ws_latency: float
+        The gateway heartbeat latency in seconds, NaN before the bot connected.
+    loop_lag: float
+        The worst event loop lag in seconds since the sample before.
+    """
+
+    at: float
+    guilds: int
+    members: int
+    ws_latency: float
+    loop_lag: float
+    rss: Optional[int] = None
+    vms: Optional[int] = None
+    cpu_percent: Optional[float] = None
+    threads: Optional[int] = None
+    memory_available: Optional[int] = None
+    memory_total: Optional[int] = None
+    memory_percent: Optional[float] = None
+    load_average: Optional[Tuple[float, float, float]] = None
+
+
+class ResourceSampler:
+    """Samples ``bot``'s resource usage every ``interval`` seconds, keeping the last ``capacity`` samples.
+
+    Parameters
+    ----------
+    bot: :class:`Millenia`
+        The bot to sample.
+    interval: float
+        How often in seconds a sample is taken.
+    capacity: int
+        How many samples are kept, a day's worth by default.
+    app_info_ttl: float
+        How long in seconds the application's info is kept before it's fetched again.
+
+    Attributes
+    ----------
+    samples: Deque[:class:`ResourceSample`]
+        The samples, oldest first.
+    """
+
+    def __init__(self, bot: Millenia, *, interval: float = 60, capacity: int = 1440, app_info_ttl: float = 60 * 60) -> None:
+        self.bot = bot
+        self.interval = interval
+        self.app_info_ttl = app_info_ttl
+        self.samples: Deque[ResourceSample] = collections.deque(maxlen=capacity)
+
+        self._process = None
+        # Only ever sampled from one thread at a time, cpu_percent measures since the call before.
+        self._process_lock = threading.Lock()
+        self._app_info: Optional[discord.AppInfo] = None
+        self._app_info_expires_at = 0.0
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def latest(self) -> Optional[ResourceSample]:
+        return self.samples[-1] if self.samples else None
+
+    def start(self) -> None:
+        """Starts sampling. Must be called from within the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="resource-sampler")
+
+    async def close(self) -> None:
+        """|coro|
+        Stops sampling, letting a sample that's being taken finish first.
+        """
+        self._closing.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sample()
+            except Exception:
+                _logger.exception("Failed to sample resource usage")
+
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                return
+
+    async def sample(self) -> ResourceSample:
+        """|coro|
+        Takes a sample now and adds it to :attr:`samples`.
+        """
+        bot = self.bot
+        fields = await asyncio.to_thread(self._sample_system) if psutil is not None else {}
+        sample = ResourceSample(
+            at=time.time(),
+            guilds=len(bot.guilds),
+            # Lean mode doesn't cache members, the servers' own counts cover everyone.
+            members=sum(guild.member_count or 0 for guild in bot.guilds),
+            ws_latency=bot.latency if math.isfinite(bot.latency) else math.nan,
+            loop_lag=bot.loop_monitor.pop_peak_lag(),
+            **fields,
+        )
+        self.samples.append(sample)
+        return sample
+
+    def _sample_system(self) -> dict:
+        with self._process_lock:
+            if self._process is None:
+                self._process = psutil.Process()
+                # The first reading is always 0, it only starts measuring from here.
+                self._process.cpu_percent()
+
+            with self._process.oneshot():
+                memory = self._process.memory_info()
+                cpu_percent = self._process.cpu_percent()
+                threads = self._process.num_threads()
+
+        system_memory = psutil.virtual_memory()
+        return {
+            "rss": memory.rss,
+            "vms": memory.vms,
+            "cpu_percent": cpu_percent,
+            "threads": threads,
+            "memory_available": system_memory.available,
+            "memory_total": system_memory.total,
+            "memory_percent": system_memory.percent,
+            "load_average": psutil.getloadavg(),
+        }
+
+    async def application_info(self) -> discord.AppInfo:
+        """|coro|
+        The application's info, fetched again once it's older than ``app_info_ttl``.
+        """
+        if self._app_info is None or time.monotonic() >= self._app_info_expires_at:
+            self._app_info = await self.bot.application_info()
+            self._app_info_expires_at = time.monotonic() + self.app_info_ttl
+        return self._app_info
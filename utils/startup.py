@@ -0,0 +1,181 @@
+"""
+Loads the bot's extensions and times each step of starting up.
+
+Extensions are found in ``cogs`` without importing them: each file is parsed and any module level declarations
+are read straight from its syntax tree. An extension that has to be loaded after others names them in
+``LOAD_AFTER``:
+
+.. code-block:: python
+
+    LOAD_AFTER = ("cogs.dev.errorhandler",)
+
+Everything else is loaded concurrently, in layers, each layer waiting only on the one before it.
+How long every phase of startup and every extension took is kept in :class:`StartupTimings`.
+"""
+from __future__ import annotations
+
+import ast
+import asyncio
+import logging
+import pathlib
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from discord.ext import commands
+
+_logger = logging.getLogger(__name__)
+
+EXTENSIONS_DIRECTORY = pathlib.Path("cogs")
+
+
+class ExtensionOrderError(Exception):
+    """Raised when the extensions' ``LOAD_AFTER`` declarations can't be satisfied."""
+
+
+def read_declarations(path: pathlib.Path, names: Iterable[str], /) -> Dict[str, Any]:
+    """Reads the module level constants called ``names`` from the Python file at ``path`` without running it.
+
+    Only literals (strings, numbers, tuples, lists, dicts, sets, booleans and ``None``) can be read.
+    """
+    wanted = set(names)
+    found: Dict[str, Any] = {}
+
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            continue
+
+        for target in targets:
+            if isinstance(target, ast.Name) and target.id in wanted:
+                found[target.id] = ast.literal_eval(value)
+
+    return found
+
+
+@dataclass(frozen=True, slots=True)
+class ExtensionSpec:
+    name: str
+    path: pathlib.Path
+    load_after: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_path(cls, path: pathlib.Path, /) -> ExtensionSpec:
+        declarations = read_declarations(path, ("LOAD_AFTER",))
+        return cls(".".join(path.parts).removesuffix(".py"), path, tuple(declarations.get("LOAD_AFTER", ())))
+
+
+def discover_extensions(directory: pathlib.Path = EXTENSIONS_DIRECTORY, /) -> List[ExtensionSpec]:
+    """Every extension in ``directory``, any file that doesn't start with an _."""
+    return [ExtensionSpec.from_path(path) for path in sorted(directory.glob("**/[!_]*.py"))]
+
+
+def load_layers(specs: List[ExtensionSpec], /, *, loaded: Iterable[str] = ()) -> List[List[ExtensionSpec]]:
+    """Groups ``specs`` into layers that only depend on the layers before them.
+
+    Raises
+    ------
+    `ExtensionOrderError`
+        An extension waits on one that doesn't exist, or extensions wait on each other.
+    """
+    done = set(loaded)
+    known = done | {spec.name for spec in specs}
+    for spec in specs:
+        missing = [name for name in spec.load_after if name not in known]
+        if missing:
+            raise ExtensionOrderError(f"{spec.name} loads after {', '.join(missing)}, which don't exist")
+
+    layers: List[List[ExtensionSpec]] = []
+    remaining = list(specs)
+    while remaining:
+        layer = [spec for spec in remaining if all(name in done for name in spec.load_after)]
+        if not layer:
+            names = ", ".join(spec.name for spec in remaining)
+            raise ExtensionOrderError(f"{names} are waiting on each other to load")
+
+        layers.append(layer)
+        done.update(spec.name for spec in layer)
+        remaining = [spec for spec in remaining if spec.name not in done]
+
+    return layers
+
+
+class StartupTimings:
+    """How long each phase of startup took, measured from when this was made.
+
+    Attributes
+    ----------
+    phases: Dict[str, Tuple[float, float]]
+        Each phase's start, as seconds since startup began, and duration, in the order they started.
+    extensions: Dict[str, float]
+        How long each extension took to load, in seconds.
+    ready_after: Optional[float]
+        Seconds from startup to the first READY, if it's happened yet.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: Dict[str, Tuple[float, float]] = {}
+        self.extensions: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self._open: Dict[str, float] = {}
+
+    def begin(self, name: str, /) -> None:
+        self._open[name] = time.perf_counter()
+
+    def end(self, name: str, /) -> None:
+        start = self._open.pop(name, None)
+        if start is not None:
+            self.phases[name] = (start - self.started, time.perf_counter() - start)
+
+    @contextmanager
+    def phase(self, name: str, /) -> Iterator[None]:
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def mark_ready(self) -> bool:
+        """Records the first READY, returning whether this was it."""
+        if self.ready_after is not None:
+            return False
+        self.ready_after = time.perf_counter() - self.started
+        return True
+
+
+async def load_extensions(
+    bot: commands.Bot, specs: List[ExtensionSpec], timings: StartupTimings, /, *, loaded: Iterable[str] = ()
+) -> None:
+    """|coro|
+    Loads ``specs`` a layer at a time, each layer's extensions concurrently, and records how long each took.
+
+    Raises
+    ------
+    `ExtensionOrderError`
+        See :func:`load_layers`.
+    `discord.ext.commands.ExtensionError`
+        The first extension that failed to load. The rest of its layer is still loaded, later layers aren't.
+    """
+
+    async def load(spec: ExtensionSpec) -> None:
+        start = time.perf_counter()
+        try:
+            await bot.load_extension(spec.name)
+        finally:
+            timings.extensions[spec.name] = time.perf_counter() - start
+
+    for layer in load_layers(specs, loaded=loaded):
+        results = await asyncio.gather(*(load(spec) for spec in layer), return_exceptions=True)
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for error in errors[1:]:
+            _logger.error("Failed to load an extension", exc_info=error)
+        if errors:
+            raise errors[0]
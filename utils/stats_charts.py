@@ -0,0 +1,107 @@
+"""
+Draws :class:`ResourceSample` trends as a PNG, one small chart per measurement stacked on top of each other.
+"""
+from __future__ import annotations
+
+import datetime
+import io
+import math
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from utils.lazy import lazy_import
+from utils.resource_sampler import ResourceSample
+
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageFont = lazy_import("PIL.ImageFont")
+
+WIDTH = 800
+PANEL_HEIGHT = 110
+MARGIN = 12
+LABEL_HEIGHT = 18
+
+BACKGROUND = (43, 45, 49)
+GRID = (70, 73, 80)
+TEXT = (220, 221, 222)
+LINE = (87, 242, 135)
+
+
+class Series(NamedTuple):
+    title: str
+    value: Callable[[ResourceSample], Optional[float]]
+    format: str
+
+
+SERIES = (
+    Series("Memory (RSS)", lambda sample: sample.rss and sample.rss / (1024 * 1024), "{:,.1f} MiB"),
+    Series("CPU", lambda sample: sample.cpu_percent, "{:,.1f}%"),
+    Series("Threads", lambda sample: sample.threads, "{:,.0f}"),
+    Series("WS latency", lambda sample: sample.ws_latency * 1000, "{:,.0f}ms"),
+    Series("Loop lag", lambda sample: sample.loop_lag * 1000, "{:,.1f}ms"),
+    Series("Servers", lambda sample: sample.guilds, "{:,.0f}"),
+    Series("Members", lambda sample: sample.members, "{:,.0f}"),
+)
+
+
+def _points(samples: Sequence[ResourceSample], series: Series) -> List[Tuple[float, float]]:
+    points = []
+    for sample in samples:
+        value = series.value(sample)
+        if value is not None and math.isfinite(value):
+            points.append((sample.at, float(value)))
+    return points
+
+
+def render_trends(samples: Sequence[ResourceSample], /) -> bytes:
+    """Charts every series with data in ``samples`` and returns the PNG. Blocks, run it in a thread."""
+    charted = [(series, points) for series in SERIES if (points := _points(samples, series))]
+    font = ImageFont.load_default(size=13)
+
+    height = MARGIN + len(charted) * (PANEL_HEIGHT + MARGIN) + LABEL_HEIGHT
+    image = Image.new("RGB", (WIDTH, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+
+    start, end = samples[0].at, samples[-1].at
+    span = (end - start) or 1.0
+    left, right = MARGIN, WIDTH - MARGIN
+
+    top = MARGIN
+    for series, points in charted:
+        values = [value for _, value in points]
+        low, high = min(values), max(values)
+        # A flat line sits in the middle rather than along an edge.
+        if high == low:
+            low, high = low - 1, high + 1
+
+        chart_top, chart_bottom = top + LABEL_HEIGHT, top + PANEL_HEIGHT
+        draw.rectangle((left, chart_top, right, chart_bottom), outline=GRID)
+        draw.text(
+            (left, top),
+            f"{series.title}: {series.format.format(values[-1])} "
+            f"(min {series.format.format(min(values))}, max {series.format.format(max(values))})",
+            fill=TEXT,
+            font=font,
+        )
+
+        xy = [
+            (
+                left + (at - start) / span * (right - left),
+                chart_bottom - (value - low) / (high - low) * (chart_bottom - chart_top),
+            )
+            for at, value in points
+        ]
+        if len(xy) > 1:
+            draw.line(xy, fill=LINE, width=2)
+        else:
+            x, y = xy[0]
+            draw.ellipse((x - 2, y - 2, x + 2, y + 2), fill=LINE)
+
+        top += PANEL_HEIGHT + MARGIN
+
+    for at, anchor, x in ((start, "la", left), (end, "ra", right)):
+        label = datetime.datetime.fromtimestamp(at, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+        draw.text((x, top), label, fill=TEXT, font=font, anchor=anchor)
+
+    out = io.BytesIO()
+    image.save(out, format="png", optimize=True)
+    return out.getvalue()
@@ -0,0 +1,161 @@
+"""
+A CPU upscaler that runs on the bot's own machine.
+
+The image is cut into tiles, each tile is resized with Lanczos and sharpened with an unsharp mask in a process pool,
+and the results are pasted into the output. Tiles are cut with an overlap that's thrown away after resizing,
+so both filters see the real neighbouring pixels at tile edges and no seams show. Only a few tiles are in flight
+at a time, so besides the output itself, memory use depends on the tile size rather than the image size.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import math
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterator, NamedTuple, Tuple
+
+from utils.image_encoding import EncodingOptions, encode_image
+from utils.lazy import lazy_import
+from utils.upscale_jobs import UpscaleBackend, UpscaleResult
+
+Image = lazy_import("PIL.Image")
+ImageFilter = lazy_import("PIL.ImageFilter")
+
+Box = Tuple[int, int, int, int]
+
+# Forking a process that's running threads can leave a worker holding a copy of a lock that's never released.
+WORKER_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class Tile(NamedTuple):
+    # Where the tile goes in the input, and the bigger box that's cut out and resized to make it.
+    box: Box
+    padded: Box
+
+
+def tiles(size: Tuple[int, int], tile_size: int, overlap: int, /) -> Iterator[Tile]:
+    """Covers an image of ``size`` with tiles of at most ``tile_size`` pixels a side, padded by ``overlap``."""
+    width, height = size
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            right, bottom = min(left + tile_size, width), min(top + tile_size, height)
+            padded = (
+                max(left - overlap, 0),
+                max(top - overlap, 0),
+                min(right + overlap, width),
+                min(bottom + overlap, height),
+            )
+            yield Tile((left, top, right, bottom), padded)
+
+
+def _scale_box(box: Box, scale: float, /) -> Box:
+    return tuple(round(edge * scale) for edge in box)  # type: ignore
+
+
+def upscale_tile(mode: str, size: Tuple[int, int], raw: bytes, tile: Tile, scale: float, /) -> bytes:
+    """Resizes and sharpens the padded tile of ``raw`` pixels, then crops the padding back off. Runs inside a worker."""
+    padded = Image.frombytes(mode, size, raw)
+
+    left, top, right, bottom = _scale_box(tile.padded, scale)
+    resized = padded.resize((right - left, bottom - top), Image.Resampling.LANCZOS)
+    sharpened = resized.filter(ImageFilter.UnsharpMask(radius=2, percent=80, threshold=2))
+
+    core = _scale_box(tile.box, scale)
+    return sharpened.crop((core[0] - left, core[1] - top, core[2] - left, core[3] - top)).tobytes()
+
+
+class LocalBackend(UpscaleBackend):
+    """Upscales on the CPU with a tiled Lanczos resize and unsharp mask.
+
+    Parameters
+    ----------
+    scale: int
+        How many times bigger each side of the output is.
+    max_output_pixels: int
+        Inputs that would come out bigger than this are scaled up by less, just enough to reach it.
+    tile_size: int
+        The longest side of a tile in input pixels.
+    overlap: int
+        How many input pixels each tile is padded by on every side.
+    max_workers: int
+        The amount of worker processes.
+    options: :class:`utils.image_encoding.EncodingOptions`
+        How the output is encoded.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        *,
+        scale: int = 4,
+        max_output_pixels: int = 4096 * 4096,
+        tile_size: int = 256,
+        overlap: int = 8,
+        max_workers: int = 2,
+        options: EncodingOptions = EncodingOptions(formats=("webp", "jpeg"), target_bytes=8 * 1024 * 1024),
+    ) -> None:
+        self.scale = scale
+        self.max_output_pixels = max_output_pixels
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_workers = max_workers
+        self.options = options
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=WORKER_CONTEXT)
+
+    @property
+    def version(self) -> str:
+        return f"{self.name}:lanczos-unsharp:x{self.scale}:{self.max_output_pixels}"
+
+    @property
+    def max_input_pixels(self) -> int:
+        # Bigger inputs get scaled up by less than `scale`, so they'd come out the same size anyway.
+        return self.max_output_pixels // self.scale**2
+
+    def scale_for(self, size: Tuple[int, int], /) -> float:
+        """The scale an image of ``size`` is upscaled by, at most :attr:`scale` and within ``max_output_pixels``."""
+        width, height = size
+        return max(min(self.scale, math.sqrt(self.max_output_pixels / (width * height))), 1.0)
+
+    def upscale_image(self, img: Image.Image, /) -> Image.Image:
+        """Upscales ``img`` in the worker processes, keeping at most two tiles per worker in flight."""
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        scale = self.scale_for(img.size)
+        output = Image.new(img.mode, _scale_box((0, 0, *img.size), scale)[2:])
+
+        in_flight: Deque[Tuple[Tile, Future[bytes]]] = deque()
+
+        def paste_oldest() -> None:
+            tile, future = in_flight.popleft()
+            left, top, right, bottom = _scale_box(tile.box, scale)
+            output.paste(Image.frombytes(img.mode, (right - left, bottom - top), future.result()), (left, top))
+
+        for tile in tiles(img.size, self.tile_size, self.overlap):
+            if len(in_flight) >= self.max_workers * 2:
+                paste_oldest()
+
+            padded = img.crop(tile.padded)
+            future = self._executor.submit(upscale_tile, img.mode, padded.size, padded.tobytes(), tile, scale)
+            in_flight.append((tile, future))
+
+        while in_flight:
+            paste_oldest()
+
+        return output
+
+    def _run(self, data: bytes, /) -> UpscaleResult:
+        with Image.open(io.BytesIO(data)) as image:
+            output = self.upscale_image(image)
+
+        encoded = encode_image(output, self.options)
+        return UpscaleResult(data=encoded.data, extension=encoded.extension)
+
+    async def upscale(self, data: bytes, /) -> UpscaleResult:
+        return await asyncio.to_thread(self._run, data)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._executor.shutdown, cancel_futures=True)
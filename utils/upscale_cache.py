@@ -0,0 +1,150 @@
+"""
+Remembers upscales across restarts.
+
+Outputs are stored in the ``upscale_cache`` table under the hash of the input image and the backend version,
+so uploading the same image again is answered from the database instead of running another paid, slow upscale.
+Entries expire after a while, URLs sooner since the hosting service deletes them, and the least recently
+used ones are deleted once the table holds more than its size limit.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import TYPE_CHECKING, Optional
+
+from utils.cache import CacheStats
+from utils.upscale_jobs import UpscaleResult
+
+if TYPE_CHECKING:
+    import asqlite
+
+_logger = logging.getLogger(__name__)
+
+
+class UpscaleCache:
+    """A size bounded cache of upscale outputs in SQLite.
+
+    Parameters
+    ----------
+    pool: :class:`asqlite.Pool`
+        The pool holding the ``upscale_cache`` table.
+    ttl: float
+        How long in seconds an output stays cached.
+    url_ttl: float
+        How long in seconds an output that's only a URL stays cached. Replicate deletes outputs an hour after
+        making them.
+    max_bytes: int
+        The most bytes the cached outputs can add up to. Past that, the least recently used ones are deleted
+        until they're back under 90% of it.
+    """
+
+    def __init__(
+        self,
+        pool: asqlite.Pool,
+        *,
+        ttl: float = 7 * 24 * 60 * 60,
+        url_ttl: float = 55 * 60,
+        max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.pool = pool
+        self.ttl = ttl
+        self.url_ttl = url_ttl
+        self.max_bytes = max_bytes
+        self._stats = CacheStats(max_size=max_bytes)
+
+    async def get(self, input_hash: str, version: str, /) -> Optional[UpscaleResult]:
+        """|coro|
+        Returns the cached output for ``input_hash`` made by ``version``, or ``None`` if there isn't one.
+        """
+        now = time.time()
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchone(
+                "SELECT url, data, extension, expires_at FROM upscale_cache WHERE input_hash = ? AND version = ?",
+                input_hash,
+                version,
+            )
+            if row is None:
+                self._stats.misses += 1
+                return None
+
+            if row["expires_at"] <= now:
+                await conn.execute("DELETE FROM upscale_cache WHERE input_hash = ? AND version = ?", input_hash, version)
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return None
+
+            await conn.execute(
+                "UPDATE upscale_cache SET hits = hits + 1, last_used_at = ? WHERE input_hash = ? AND version = ?",
+                now,
+                input_hash,
+                version,
+            )
+
+        self._stats.hits += 1
+        return UpscaleResult(url=row["url"], data=row["data"], extension=row["extension"])
+
+    async def put(self, input_hash: str, version: str, result: UpscaleResult, /) -> None:
+        """|coro|
+        Caches ``result`` as the output of ``version`` for ``input_hash``, then evicts down to the size limit.
+        """
+        size = len(result.data or b"") + len((result.url or "").encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        ttl = self.ttl if result.data is not None else min(self.ttl, self.url_ttl)
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """INSERT OR REPLACE INTO upscale_cache(
+                    input_hash, version, url, data, extension, size, created_at, last_used_at, expires_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                input_hash,
+                version,
+                result.url,
+                result.data,
+                result.extension,
+                size,
+                now,
+                now,
+                now + ttl,
+            )
+
+        await self.evict()
+
+    async def evict(self) -> None:
+        """|coro|
+        Deletes expired outputs, then the least recently used ones while over the size limit.
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute("DELETE FROM upscale_cache WHERE expires_at <= ?", time.time())
+            expired = await conn.fetchone("SELECT changes() AS count")
+            self._stats.expirations += expired["count"]
+
+            total = await conn.fetchone("SELECT COALESCE(SUM(size), 0) AS size FROM upscale_cache")
+            size = total["size"]
+            if size <= self.max_bytes:
+                return
+
+            target = self.max_bytes * 0.9
+            evict = []
+            rows = await conn.fetchall("SELECT input_hash, version, size FROM upscale_cache ORDER BY last_used_at")
+            for row in rows:
+                if size <= target:
+                    break
+                evict.append((row["input_hash"], row["version"]))
+                size -= row["size"]
+
+            await conn.executemany("DELETE FROM upscale_cache WHERE input_hash = ? AND version = ?", evict)
+            self._stats.evictions += len(evict)
+            _logger.info("Evicted %d upscales from the cache", len(evict))
+
+    async def stats(self) -> CacheStats:
+        """|coro|
+        The hit, miss and eviction counters since startup, along with the size of the table right now.
+        """
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchone("SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS size FROM upscale_cache")
+
+        self._stats.entries = row["entries"]
+        self._stats.size = row["size"]
+        return self._stats
@@ -0,0 +1,87 @@
+"""
+Gets attachments ready to be upscaled.
+
+Phone photos are often far bigger than a backend can make use of and carry EXIF and colour profiles nobody needs,
+all of which makes uploading them slower and the upscale more expensive. :func:`prepare_input` checks an image's
+size from its header alone, shrinks it to the most pixels the backend is worth feeding (decoding JPEGs at reduced
+scale to begin with), drops the metadata and re-encodes what's left.
+"""
+from __future__ import annotations
+
+import io
+import math
+from typing import NamedTuple, Tuple
+
+from PIL import UnidentifiedImageError
+
+from utils.image_encoding import EncodingOptions, encode_image
+from utils.lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+
+# Anything bigger is most likely a decompression bomb rather than a photo.
+MAX_SOURCE_PIXELS = 64 * 1024 * 1024
+
+
+class InvalidUpscaleInput(Exception):
+    """Raised when an attachment can't or shouldn't be upscaled."""
+
+
+class PreparedInput(NamedTuple):
+    data: bytes
+    size: Tuple[int, int]
+    original_size: Tuple[int, int]
+
+    @property
+    def downscaled(self) -> bool:
+        return self.size != self.original_size
+
+
+def prepare_input(
+    data: bytes,
+    max_pixels: int,
+    /,
+    *,
+    max_source_pixels: int = MAX_SOURCE_PIXELS,
+    options: EncodingOptions = EncodingOptions(formats=("jpeg",), max_quality=95, target_bytes=None),
+) -> PreparedInput:
+    """Shrinks ``data`` to at most ``max_pixels``, strips its metadata and re-encodes it per ``options``.
+    Images with transparency are always re-encoded as PNG.
+
+    Raises
+    ------
+    `InvalidUpscaleInput`
+        ``data`` isn't an image, or its header claims more than ``max_source_pixels`` pixels.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise InvalidUpscaleInput("That isn't an image I can read") from e
+
+    with image:
+        # Only the header has been read so far.
+        original_size = image.size
+        width, height = original_size
+        if width * height > max_source_pixels:
+            raise InvalidUpscaleInput(f"The image is {width}x{height}, which is too big to upscale")
+
+        if width * height > max_pixels:
+            scale = math.sqrt(max_pixels / (width * height))
+            # For JPEGs this decodes straight to a fraction of the full size instead of decoding it all first.
+            image.thumbnail((max(int(width * scale), 1), max(int(height * scale), 1)), Image.Resampling.LANCZOS)
+
+        # Rotate phone photos upright, their orientation lives in the EXIF about to be dropped.
+        upright = ImageOps.exif_transpose(image)
+        has_alpha = "A" in upright.getbands() or "transparency" in upright.info
+        pixels = upright.convert("RGBA" if has_alpha else "RGB")
+
+    # EXIF, ICC profiles, comments and the rest would otherwise be written back out by some encoders.
+    pixels.info.clear()
+
+    if has_alpha:
+        out = io.BytesIO()
+        pixels.save(out, format="png", optimize=True)
+        return PreparedInput(out.getvalue(), pixels.size, original_size)
+
+    return PreparedInput(encode_image(pixels, options).data, pixels.size, original_size)
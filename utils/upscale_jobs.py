@@ -0,0 +1,291 @@
+"""
+Queues upscales and runs them off the event loop.
+
+An upscale takes up to 20 seconds, so commands only submit a job to :class:`UpscaleQueue` and wait on it, while a
+fixed amount of workers hand the jobs to an :class:`UpscaleBackend` one at a time each. Jobs are keyed by a hash of
+the image, so the same attachment upscaled twice while the first is still waiting or running only runs once.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, NamedTuple, Optional, Set
+
+from utils.lazy import lazy_import
+
+if TYPE_CHECKING:
+    from utils.upscale_cache import UpscaleCache
+
+_logger = logging.getLogger(__name__)
+
+# Only needed once an upscale actually runs on Replicate, and slow to import.
+replicate = lazy_import("replicate")
+
+REAL_ESRGAN_MODEL = "nightmareai/real-esrgan:42fed1c4974146d4d2414e2be2c5277c7fcf05fcc3a73abf41610695738c1d7b"
+
+
+def image_key(data: bytes, /) -> str:
+    """The key jobs and cached outputs for the image ``data`` are stored under."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class UpscaleResult(NamedTuple):
+    """What a backend made. Remote backends hand back a URL to the output, local ones the encoded image."""
+
+    url: Optional[str] = None
+    data: Optional[bytes] = None
+    extension: str = "png"
+
+
+class UpscaleBackend:
+    """The base for whatever does the upscaling.
+
+    Subclasses implement :meth:`upscale`, which has to keep the event loop free while it works.
+    """
+
+    name: str = "backend"
+    # The most input pixels worth sending, anything bigger is shrunk to it first.
+    max_input_pixels: int = 1024 * 1024
+
+    @property
+    def version(self) -> str:
+        """:class:`str`: Identifies the model and its settings, outputs of different versions differ."""
+        return self.name
+
+    async def upscale(self, data: bytes, /) -> UpscaleResult:
+        """|coro|
+        Upscales the encoded image ``data``.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """|coro|
+        Releases anything the backend holds on to.
+        """
+
+
+class ReplicateBackend(UpscaleBackend):
+    """Upscales with a model hosted on Replicate.
+
+    Parameters
+    ----------
+    model: str
+        The ``owner/name:version`` of the model to run.
+    """
+
+    name = "replicate"
+    # Real-ESRGAN refuses anything over this many pixels, it wouldn't fit in the GPU's memory.
+    max_input_pixels = 2096704
+
+    def __init__(self, model: str = REAL_ESRGAN_MODEL) -> None:
+        self.model = model
+
+    @property
+    def version(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def _run(self, data: bytes, /) -> UpscaleResult:
+        # The client polls until the prediction is done, so this blocks for as long as the upscale takes.
+        # Only file objects are uploaded, raw bytes would be JSON encoded and fail.
+        output = replicate.run(self.model, input={"image": io.BytesIO(data)})
+        return UpscaleResult(url=str(output))
+
+    async def upscale(self, data: bytes, /) -> UpscaleResult:
+        return await asyncio.to_thread(self._run, data)
+
+
+class UpscaleQueueFull(Exception):
+    """Raised when too many upscales are already waiting."""
+
+
+class UpscaleLimitReached(Exception):
+    """Raised when a user already has as many upscales queued as they're allowed."""
+
+
+class UpscaleJob:
+    """An upscale waiting for, or being run by, a worker. Every request for the same image shares one job.
+
+    Attributes
+    ----------
+    key: str
+        The SHA-256 of the image.
+    data: bytes
+        The image to upscale.
+    owners: Set[int]
+        The ids of the users waiting on the job.
+    started: :class:`asyncio.Event`
+        Set once a worker picks the job up.
+    """
+
+    __slots__ = ("key", "data", "owners", "started", "_future")
+
+    def __init__(self, key: str, data: bytes, /) -> None:
+        self.key = key
+        self.data = data
+        self.owners: Set[int] = set()
+        self.started = asyncio.Event()
+        self._future: asyncio.Future[UpscaleResult] = asyncio.get_running_loop().create_future()
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    async def wait(self) -> UpscaleResult:
+        """|coro|
+        Waits for the job to finish. Cancelling the wait doesn't cancel the job, other requests may share it.
+
+        Raises
+        ------
+        `Exception`
+            Whatever the backend raised.
+        """
+        return await asyncio.shield(self._future)
+
+
+class UpscaleQueue:
+    """Runs upscales with a bounded amount of workers.
+
+    Parameters
+    ----------
+    backend: :class:`UpscaleBackend`
+        What runs the upscales.
+    workers: int
+        The most upscales running at once.
+    max_queued: int
+        The most jobs allowed to wait for a worker. Past that, :meth:`submit` raises :class:`UpscaleQueueFull`.
+    max_per_user: int
+        The most jobs one user can have waiting or running. Past that, :meth:`submit` raises
+        :class:`UpscaleLimitReached`.
+    cache: Optional[:class:`utils.upscale_cache.UpscaleCache`]
+        Where finished outputs are stored, if anywhere.
+    """
+
+    def __init__(
+        self,
+        backend: UpscaleBackend,
+        *,
+        workers: int = 2,
+        max_queued: int = 16,
+        max_per_user: int = 2,
+        cache: Optional[UpscaleCache] = None,
+    ) -> None:
+        self.backend = backend
+        self.cache = cache
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+
+        self._pending: Deque[UpscaleJob] = deque()
+        self._jobs: Dict[str, UpscaleJob] = {}
+        self._per_user: Dict[int, int] = {}
+        # Released once per queued job, and once per worker on close.
+        self._available = asyncio.Semaphore(0)
+        self._closing = False
+        self._tasks: List[asyncio.Task[None]] = []
+
+    @property
+    def running(self) -> int:
+        """:class:`int`: The amount of jobs a worker is running."""
+        return len(self._jobs) - len(self._pending)
+
+    @property
+    def queued(self) -> int:
+        """:class:`int`: The amount of jobs waiting for a worker."""
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Starts the workers. Must be called from within the running event loop."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"upscale-worker-{number}") for number in range(self.workers)
+            ]
+
+    def position(self, job: UpscaleJob, /) -> int:
+        """``job``'s place in line, 1 being next, or 0 once it's running."""
+        try:
+            return self._pending.index(job) + 1
+        except ValueError:
+            return 0
+
+    def submit(self, user_id: int, data: bytes, /, *, key: Optional[str] = None) -> UpscaleJob:
+        """Queues ``data`` to be upscaled for ``user_id``, or joins the job already queued for the same image.
+        ``key`` is the :func:`image_key` of ``data``, if it was already worked out.
+
+        Raises
+        ------
+        `RuntimeError`
+            The queue is closed.
+        `UpscaleLimitReached`
+            ``user_id`` already has ``max_per_user`` jobs.
+        `UpscaleQueueFull`
+            ``max_queued`` jobs are already waiting.
+        """
+        if self._closing or not self._tasks:
+            raise RuntimeError("UpscaleQueue is not running")
+
+        key = key or image_key(data)
+        job = self._jobs.get(key)
+
+        if job is None or user_id not in job.owners:
+            if self._per_user.get(user_id, 0) >= self.max_per_user:
+                raise UpscaleLimitReached(f"User {user_id} already has {self.max_per_user} upscales queued")
+
+        if job is None:
+            if len(self._pending) >= self.max_queued:
+                raise UpscaleQueueFull(f"{len(self._pending)} upscales are already waiting")
+
+            job = self._jobs[key] = UpscaleJob(key, data)
+            self._pending.append(job)
+            self._available.release()
+        else:
+            _logger.debug("Coalesced an upscale of %s into the job already queued", key)
+
+        if user_id not in job.owners:
+            job.owners.add(user_id)
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        return job
+
+    def _finish(self, job: UpscaleJob, /) -> None:
+        del self._jobs[job.key]
+        for user_id in job.owners:
+            remaining = self._per_user[user_id] - 1
+            if remaining:
+                self._per_user[user_id] = remaining
+            else:
+                del self._per_user[user_id]
+
+    async def _worker(self) -> None:
+        while True:
+            await self._available.acquire()
+            if not self._pending:
+                return
+            job = self._pending.popleft()
+
+            job.started.set()
+            try:
+                result = await self.backend.upscale(job.data)
+            except Exception as e:
+                _logger.exception("Upscale of %s failed", job.key)
+                job._future.set_exception(e)
+            else:
+                job._future.set_result(result)
+                if self.cache is not None:
+                    try:
+                        await self.cache.put(job.key, self.backend.version, result)
+                    except Exception:
+                        _logger.exception("Failed to cache the upscale of %s", job.key)
+            finally:
+                self._finish(job)
+
+    async def close(self) -> None:
+        """|coro|
+        Stops accepting jobs, waits for the queued ones to finish and closes the backend.
+        """
+        self._closing = True
+        for _ in self._tasks:
+            self._available.release()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.backend.close()
@@ -0,0 +1,162 @@
+"""
+Group commits for single row inserts.
+
+Every cog that inserts one row per command (todos, tickets, ...) would otherwise commit, and fsync, once per message.
+:class:`InsertBatcher` collects the inserts made within a few milliseconds of each other and writes them in one
+transaction, handing every caller back the id of their row.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from itertools import groupby
+from typing import TYPE_CHECKING, Any, Deque, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import asqlite
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _PendingInsert:
+    table: str
+    columns: Tuple[str, ...]
+    values: Tuple[Any, ...]
+    future: asyncio.Future[int]
+
+    @property
+    def statement(self) -> Tuple[str, Tuple[str, ...]]:
+        return self.table, self.columns
+
+
+class InsertBatcher:
+    """Batches inserts from every cog into shared transactions.
+
+    A batch is written once ``max_batch`` rows are waiting or ``max_delay`` seconds after its first row
+    was queued, whichever comes first.
+
+    Parameters
+    ----------
+    pool: :class:`asqlite.Pool`
+        The pool to write to.
+    max_delay: float
+        The longest time in seconds a row waits for others to join its batch.
+    max_batch: int
+        The most rows written in one transaction.
+    """
+
+    def __init__(self, pool: asqlite.Pool, *, max_delay: float = 0.005, max_batch: int = 128) -> None:
+        self.pool = pool
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+
+        self._pending: Deque[_PendingInsert] = deque()
+        self._wakeup = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        """Starts the background writer. Must be called from within the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="insert-batcher")
+
+    async def insert(self, table: str, **values: Any) -> int:
+        """|coro|
+        Queues a row to be inserted into ``table`` and waits for its batch to be committed.
+
+        ``table`` and the keyword names are put into the query as is, never pass user input as them.
+
+        Returns
+        -------
+        `int`
+            The id of the inserted row.
+
+        Raises
+        ------
+        `RuntimeError`
+            The batcher is closed.
+        `sqlite3.Error`
+            The batch this row was in failed to commit.
+        """
+        if self._closing or self._task is None:
+            raise RuntimeError("InsertBatcher is not running")
+
+        future: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingInsert(table, tuple(values), tuple(values.values()), future))
+
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._batch_full.set()
+
+        return await future
+
+    async def close(self) -> None:
+        """|coro|
+        Stops accepting inserts and waits for every queued row to be written.
+        """
+        self._closing = True
+        self._wakeup.set()
+        self._batch_full.set()
+
+        if self._task is not None:
+            await self._task
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                continue
+
+            if len(self._pending) < self.max_batch and not self._closing:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch))]
+            if len(self._pending) < self.max_batch and not self._closing:
+                self._batch_full.clear()
+
+            try:
+                await self._write(batch)
+            except Exception as e:
+                _logger.exception("Failed to write a batch of %d rows", len(batch))
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+
+    async def _write(self, batch: List[_PendingInsert], /) -> None:
+        results: List[Tuple[_PendingInsert, int]] = []
+
+        async with self.pool.acquire() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Rows inserted by one statement within a single write transaction get consecutive ids,
+                # so the ids can be worked out from the last one without RETURNING each row.
+                by_statement = sorted(batch, key=lambda p: p.statement)
+                for (table, columns), group in groupby(by_statement, key=lambda p: p.statement):
+                    rows = list(group)
+                    placeholders = ", ".join("?" * len(columns))
+                    await conn.executemany(
+                        f"INSERT INTO {table}({', '.join(columns)}) VALUES ({placeholders})", [p.values for p in rows]
+                    )
+                    last = await conn.fetchone("SELECT last_insert_rowid() AS id")
+                    first_id = last["id"] - len(rows) + 1
+                    results.extend((pending, first_id + offset) for offset, pending in enumerate(rows))
+
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+
+        for pending, row_id in results:
+            if not pending.future.done():
+                pending.future.set_result(row_id)